@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+from benchmark.harness import STRATEGIES, WORKLOADS, compare, run
+
+
+parser = argparse.ArgumentParser(
+    prog='python -m benchmark',
+    description='Time the CPU-bound demos serially, on threads and on '
+                'processes.')
+parser.add_argument('--workload', action='append', choices=sorted(WORKLOADS),
+                    help='workload to run (repeatable, default: all)')
+parser.add_argument('--strategy', action='append', choices=sorted(STRATEGIES),
+                    help='strategy to run (repeatable, default: all)')
+parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+parser.add_argument('--sizes', type=int, nargs='+', default=[16, 64])
+parser.add_argument('--warmup', type=int, default=1)
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--output', help='also write the report to this file')
+parser.add_argument('--baseline', help='report to check for regressions')
+parser.add_argument('--tolerance', type=float, default=0.10,
+                    help='allowed median slow-down against the baseline')
+args = parser.parse_args()
+
+strategies = args.strategy or list(STRATEGIES)
+# Speed-up is relative to the serial run, so always include it.
+if 'serial' not in strategies:
+    strategies.insert(0, 'serial')
+else:
+    strategies.sort(key=lambda name: name != 'serial')
+
+report = run(args.workload or list(WORKLOADS), strategies, args.workers,
+             args.sizes, args.warmup, args.repeat, args.seed)
+
+status = 0
+if args.baseline:
+    with open(args.baseline) as file:
+        report['regressions'] = compare(report, json.load(file), args.tolerance)
+    status = 1 if report['regressions'] else 0
+
+output = json.dumps(report, indent=2)
+print(output)
+if args.output:
+    with open(args.output, 'w') as file:
+        file.write(output + '\n')
+sys.exit(status)
@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import math
+import os
+import platform
+import random
+import statistics
+from time import perf_counter
+
+from process_executor.backend import CPUExecutor
+from process_executor.gcd import gcd
+from threads_for_blocking_IO.factorization import divisors
+
+
+def factorize_cold(number):
+    # Skip the memo, otherwise every trial after the first is a cache hit.
+    return divisors.__wrapped__(number)
+
+def gcd_inputs(size, rng):
+    return [(rng.randrange(10**4, 10**5), rng.randrange(10**4, 10**5))
+            for _ in range(size)]
+
+def factorize_inputs(size, rng):
+    return [rng.randrange(10**11, 10**12) for _ in range(size)]
+
+WORKLOADS = {
+    'gcd': (gcd, gcd_inputs),
+    'factorize': (factorize_cold, factorize_inputs),
+}
+
+class Serial:
+    name = 'serial'
+
+    def __init__(self, workers):
+        self.workers = 1
+
+    def map(self, func, items):
+        return list(map(func, items))
+
+    def shutdown(self):
+        pass
+
+class Threads:
+    name = 'thread'
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers)
+
+    def map(self, func, items):
+        return list(self.executor.map(func, items))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+class Processes:
+    name = 'process'
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers)
+
+    def map(self, func, items):
+        chunksize = max(1, math.ceil(len(items) / (4 * self.workers)))
+        return list(self.executor.map(func, items, chunksize=chunksize))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+class Backend(Processes):
+    name = 'backend'
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = CPUExecutor(workers)
+
+STRATEGIES = {strategy.name: strategy
+              for strategy in (Serial, Threads, Processes, Backend)}
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def measure(strategy, func, items, warmup, repeat):
+    # Warm-up runs absorb worker start-up and first-call import costs.
+    for _ in range(warmup):
+        strategy.map(func, items)
+    samples = []
+    for _ in range(repeat):
+        began = perf_counter()
+        strategy.map(func, items)
+        samples.append(perf_counter() - began)
+    return {'median': statistics.median(samples),
+            'p95': percentile(samples, 0.95),
+            'min': min(samples),
+            'samples': samples}
+
+def run(workloads=tuple(WORKLOADS), strategies=tuple(STRATEGIES),
+        workers=(1, 2, 4), sizes=(16, 64), warmup=1, repeat=5, seed=0):
+    results = []
+    for workload in workloads:
+        func, make_inputs = WORKLOADS[workload]
+        for size in sizes:
+            items = make_inputs(size, random.Random(seed))
+            serial = None
+            for name in strategies:
+                counts = [1] if name == 'serial' else workers
+                for count in counts:
+                    strategy = STRATEGIES[name](count)
+                    try:
+                        timing = measure(strategy, func, items, warmup, repeat)
+                    finally:
+                        strategy.shutdown()
+                    if name == 'serial':
+                        serial = timing['median']
+                    result = {'workload': workload, 'strategy': name,
+                              'workers': strategy.workers, 'size': size}
+                    result.update(timing)
+                    if name == 'backend':
+                        result.update(strategy.executor.stats())
+                    if serial is not None:
+                        result['speedup'] = serial / timing['median']
+                        result['efficiency'] = (result['speedup']
+                                                / strategy.workers)
+                    results.append(result)
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'cpus': os.cpu_count(),
+            'warmup': warmup,
+            'repeat': repeat,
+            'seed': seed,
+            'results': results}
+
+def key(result):
+    return (result['workload'], result['strategy'], result['workers'],
+            result['size'])
+
+def compare(report, baseline, tolerance=0.10):
+    previous = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        change = result['median'] / before['median'] - 1
+        if change > tolerance:
+            regressions.append({'workload': result['workload'],
+                                'strategy': result['strategy'],
+                                'workers': result['workers'],
+                                'size': result['size'],
+                                'baseline': before['median'],
+                                'median': result['median'],
+                                'change': change})
+    return regressions
@@ -1,4 +1,9 @@
-from queue import Queue
+from collections import namedtuple
+from heapq import heappop, heappush
+from itertools import count
+from queue import Empty, Queue
+from random import random
+import sys
 from threading import Thread
 import time
 
@@ -19,20 +24,144 @@ class ClosableQueue(Queue):
                 self.task_done()
 
 
+DeadLetter = namedtuple('DeadLetter', ['item', 'error', 'attempts'])
+
+class ErrorPolicy:
+    def __init__(self, retries=0, backoff=0.01, max_backoff=1.0, jitter=0.5,
+                 retry_on=(Exception,), dead_letter_queue=None,
+                 max_restarts=10):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.dead_letter_queue = dead_letter_queue
+        self.max_restarts = max_restarts
+
+    def should_retry(self, error, attempts):
+        return attempts <= self.retries and isinstance(error, self.retry_on)
+
+    def delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * (1 - self.jitter * random())
+
+    def dead_letter(self, item, error, attempts):
+        if self.dead_letter_queue is None:
+            print(f'dropped {item!r} after {attempts} attempts: {error!r}',
+                  file=sys.stderr)
+        else:
+            self.dead_letter_queue.put(DeadLetter(item, error, attempts))
+
+
 in_queue = ClosableQueue()
 out_queue = ClosableQueue()
+dead_queue = ClosableQueue()
 
 class StoppableWorker(Thread):
-    def __init__(self, func, in_queue, out_queue):
+    def __init__(self, func, in_queue, out_queue, policy=None):
         super().__init__()
         self.func = func
         self.in_queue = in_queue
         self.out_queue = out_queue
+        self.policy = ErrorPolicy() if policy is None else policy
+        self.retries = []
+        self.sequence = count()
+        self.stopping = False
+        self.siblings = None
+        self.restarts = 0
+        self.gone = False
 
-    def run(self):
-        for item in self.in_queue:
-            result = self.func(item)
+    def attempt(self, item, attempts):
+        parked = False
+        try:
+            try:
+                result = self.func(item)
+            except Exception as error:
+                attempts += 1
+                if self.policy.should_retry(error, attempts):
+                    due = time.monotonic() + self.policy.delay(attempts)
+                    heappush(self.retries,
+                             (due, next(self.sequence), attempts, item, error))
+                    parked = True
+                else:
+                    self.policy.dead_letter(item, error, attempts)
+                return
+            except BaseException as error:
+                # The worker dies with this one; the item must not.
+                self.policy.dead_letter(item, error, attempts + 1)
+                raise
             self.out_queue.put(result)
+        finally:
+            if not parked:
+                self.in_queue.task_done()
+
+    def retry_due(self):
+        _, _, attempts, item, _ = heappop(self.retries)
+        self.attempt(item, attempts)
+
+    def work(self):
+        while self.retries or not self.stopping:
+            timeout = None
+            if self.retries:
+                timeout = max(self.retries[0][0] - time.monotonic(), 0)
+            if self.stopping:
+                time.sleep(timeout)
+                self.retry_due()
+                continue
+            try:
+                item = self.in_queue.get(timeout=timeout)
+            except Empty:
+                self.retry_due()
+                continue
+            if item is self.in_queue.SENTINEL:
+                self.stopping = True
+                self.in_queue.task_done()
+                continue
+            self.attempt(item, 0)
+
+    def replace(self):
+        self.gone = True
+        if (self.siblings is not None
+                and self.restarts < self.policy.max_restarts):
+            replacement = StoppableWorker(self.func, self.in_queue,
+                                          self.out_queue, self.policy)
+            replacement.retries = self.retries
+            replacement.stopping = self.stopping
+            replacement.siblings = self.siblings
+            replacement.restarts = self.restarts + 1
+            self.siblings.append(replacement)
+            replacement.start()
+            return
+        # Nobody takes over, so settle what this worker owes the queue.
+        while self.retries:
+            _, _, attempts, item, error = heappop(self.retries)
+            try:
+                self.policy.dead_letter(item, error, attempts)
+            finally:
+                self.in_queue.task_done()
+        if all(thread.gone for thread in self.siblings or ()):
+            self.abandon()
+
+    def abandon(self):
+        # No workers left: dead-letter whatever is queued so join() returns.
+        error = RuntimeError('no workers left')
+        while True:
+            try:
+                item = self.in_queue.get_nowait()
+            except Empty:
+                return
+            try:
+                if item is not self.in_queue.SENTINEL:
+                    self.policy.dead_letter(item, error, 0)
+            finally:
+                self.in_queue.task_done()
+
+    def run(self):
+        try:
+            self.work()
+        except BaseException:
+            self.replace()
+            raise
 
 def game_logic(state, neighbors):
     time.sleep(0.01)
@@ -49,25 +178,21 @@ def game_logic(state, neighbors):
 
 def game_logic_thread(item):
     y, x, state, neighbors = item
-    try:
-        next_state = game_logic(state, neighbors)
-    except Exception as e:
-        next_state = e
+    next_state = game_logic(state, neighbors)
     return (y, x, next_state)
 
 # Start the threads upfront
+policy = ErrorPolicy(retries=3, retry_on=(OSError,), dead_letter_queue=dead_queue)
 threads = []
 for _ in range(5):
-    thread = StoppableWorker(game_logic_thread, in_queue, out_queue)
+    thread = StoppableWorker(game_logic_thread, in_queue, out_queue, policy)
+    thread.siblings = threads
     thread.start()
     threads.append(thread)
 
 ALIVE = '*'
 EMPTY = '-'
 
-class SimulationError(Exception):
-    pass
-
 class Grid:
     def __init__(self, height, width):
         self.height = height
@@ -96,7 +221,7 @@ def count_neighbors(y, x, get):
     count = len(list(filter(lambda x: x == ALIVE, neighbor_state)))
     return count
 
-def simulate_pipeline(grid, in_queue, out_queue):
+def simulate_pipeline(grid, in_queue, out_queue, dead_queue):
     for y in range(grid.height):
         for x in range(grid.width):
             state = grid.get(y, x)
@@ -105,14 +230,20 @@ def simulate_pipeline(grid, in_queue, out_queue):
     
     in_queue.join()
     out_queue.close()
+    dead_queue.close()
 
     next_grid = Grid(grid.height, grid.width)
     for item in out_queue:
         y, x, next_state = item
-        if isinstance(next_state, Exception):
-            raise SimulationError('Error has been raised')
         next_grid.set(y, x, next_state)
 
+    # A cell that keeps failing holds its state for this generation
+    # instead of aborting the whole simulation.
+    for letter in dead_queue:
+        y, x, state, _ = letter.item
+        next_grid.set(y, x, state)
+        print(f'Cell ({y}, {x}) kept its state: {letter.error!r}')
+
     return next_grid
 
 class ColumnsPrinter(list):
@@ -138,13 +269,13 @@ start = time.time()
 try:
     for _ in range(10):
         columns.append(str(grid))
-        grid = simulate_pipeline(grid, in_queue, out_queue)
+        grid = simulate_pipeline(grid, in_queue, out_queue, dead_queue)
     end = time.time()
     delta = end - start
     print(f'Took {delta:.3f}')
     print(columns)
 finally:
-    for thread in threads:
+    for thread in [thread for thread in threads if not thread.gone]:
         in_queue.close()
     for thread in threads:
         thread.join()
\ No newline at end of file
@@ -2,6 +2,8 @@ from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 import time
 
+from work_stealing.executor import get_executor
+
 ALIVE = '*'
 EMPTY = '-'
 
@@ -95,20 +97,26 @@ class ColumnsPrinter(list):
         return '\n'.join(output)
      
 
-grid = LockingGrid(5, 9)
-grid.set(0, 3, ALIVE)
-grid.set(1, 4, ALIVE)
-grid.set(2, 2, ALIVE)
-grid.set(2, 3, ALIVE)
-grid.set(2, 4, ALIVE)
+def run(pool):
+    grid = LockingGrid(5, 9)
+    grid.set(0, 3, ALIVE)
+    grid.set(1, 4, ALIVE)
+    grid.set(2, 2, ALIVE)
+    grid.set(2, 3, ALIVE)
+    grid.set(2, 4, ALIVE)
 
-columns = ColumnsPrinter()
-start = time.time()
-with ThreadPoolExecutor(max_workers=100) as pool:
+    columns = ColumnsPrinter()
+    start = time.time()
     for _ in range(10):
         columns.append(str(grid))
         grid = simulate_pool(pool, grid)
-end = time.time()
-delta = end - start
-print(f'Took {delta:.3f}')
-print(columns)
\ No newline at end of file
+    end = time.time()
+    delta = end - start
+    print(f'Took {delta:.3f}')
+    print(columns)
+
+with ThreadPoolExecutor(max_workers=100) as pool:
+    run(pool)
+
+# The same engine on the process-wide work-stealing executor.
+run(get_executor())
\ No newline at end of file
@@ -1,13 +1,13 @@
 import asyncio
 
-async def run_tasks(handles, interval, output_path):
+async def run_tasks(handles, interval, output_path, finished):
     with open(output_path, 'wb') as output:
         async def write_async(data):
             output.write(data)
         
         tasks = []
         for handle in handles:
-            coro = tail_async(handle, interval, write_async)
+            coro = tail_async(handle, interval, write_async, finished)
             task = asyncio.create_task(coro)
             tasks.append(task)
 
@@ -20,33 +20,106 @@ async def run_tasks(handles, interval, output_path):
 
 # asyncio.run(slow_couroutine(), debug=True)
 
-from threading import Thread
+import os
+from threading import Lock, Thread
 
+IOV_MAX = os.sysconf('SC_IOV_MAX') if hasattr(os, 'sysconf') else 1024
+
+def write_all(fd, buffers):
+    index = 0
+    while index < len(buffers):
+        written = os.writev(fd, buffers[index:index + IOV_MAX])
+        while index < len(buffers) and written >= len(buffers[index]):
+            written -= len(buffers[index])
+            index += 1
+        if written:
+            buffers[index] = memoryview(buffers[index])[written:]
+
+def resolve(futures, error):
+    for future in futures:
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+# Writers append to a shared batch under a short lock instead of hopping
+# to the write loop per line. The batch goes out in one writev once it
+# reaches flush_bytes, or flush_interval after its first line, and each
+# caller's future is then resolved in one hop per calling loop. With the
+# default interval of 0 a flush starts as soon as the write loop is free,
+# so batches grow by themselves while a previous writev is in progress.
 class WriteThread(Thread):
-    def __init__(self, output_path):
+    def __init__(self, output_path, flush_bytes=64 << 10, flush_interval=0,
+                 fsync=False):
         super().__init__()
         self.output_path = output_path
         self.output = None
         self.loop = asyncio.new_event_loop()
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.lock = Lock()
+        self.pending = []
+        self.futures = []
+        self.pending_bytes = 0
+        self.scheduled = None
 
     def run(self):
         asyncio.set_event_loop(self.loop)
-        with open(self.output_path, 'wb') as self.output:
+        with open(self.output_path, 'wb', buffering=0) as self.output:
             self.loop.run_forever()
 
         # Run one final round of callbacks so the await on
         # stop() in another event loop will be resolved.
         self.loop.run_until_complete(asyncio.sleep(0))
 
-    async def real_write(self, data):
-        self.output.write(data)
+    def flush(self):
+        with self.lock:
+            buffers, self.pending = self.pending, []
+            futures, self.futures = self.futures, []
+            self.pending_bytes = 0
+            self.scheduled = None
+        if not buffers:
+            return
+
+        error = None
+        try:
+            write_all(self.output.fileno(), buffers)
+            if self.fsync:
+                os.fsync(self.output.fileno())
+        except OSError as exc:
+            error = exc
+
+        by_loop = {}
+        for future in futures:
+            by_loop.setdefault(future.get_loop(), []).append(future)
+        for loop, batch in by_loop.items():
+            loop.call_soon_threadsafe(resolve, batch, error)
 
     async def write(self, data):
-        coro = self.real_write(data)
-        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
-        await asyncio.wrap_future(future)
+        future = asyncio.get_running_loop().create_future()
+        with self.lock:
+            self.pending.append(data)
+            self.futures.append(future)
+            self.pending_bytes += len(data)
+            if (self.pending_bytes >= self.flush_bytes
+                    or not self.flush_interval):
+                schedule = 'now' if self.scheduled != 'now' else None
+            else:
+                schedule = 'timer' if self.scheduled is None else None
+            if schedule:
+                self.scheduled = schedule
+        if schedule == 'now':
+            self.loop.call_soon_threadsafe(self.flush)
+        elif schedule == 'timer':
+            self.loop.call_soon_threadsafe(
+                self.loop.call_later, self.flush_interval, self.flush)
+        await future
 
     async def real_stop(self):
+        self.flush()
         self.loop.stop()
 
     async def stop(self):
@@ -63,28 +136,172 @@ class WriteThread(Thread):
         await self.stop()
 
 
-def readline(handle):
-    pass
+import random
+import shutil
+import tempfile
+import time
+
+from thread_coroutines_transition.line_reader import ChunkedLineReader, NoNewData
+from thread_coroutines_transition.merge import TimestampMerger
+from thread_coroutines_transition.verify import verify_merge
+from thread_coroutines_transition.watcher import Watcher
+
+def write_lines(path, count):
+    with open(path, 'ab', buffering=0) as handle:
+        for index in range(count):
+            line = f'{time.time():.6f} {os.path.basename(path)} {index}\n'
+            handle.write(line.encode())
+            time.sleep(random.random() * 0.01)
 
-async def tail_async(handle, interval, write_func):
-    pass
+async def tail_async(handle, interval, write_func, finished):
+    reader = ChunkedLineReader(handle)
+    while True:
+        # Checked before reading: once set, every line is already on disk.
+        done = finished.is_set()
+        try:
+            line = reader.readline()
+        except NoNewData:
+            if done:
+                return
+            await asyncio.sleep(interval)
+        else:
+            await write_func(line)
 
-async def run_fully_async(handle, interval, output_path):
+async def wait_for(producers, finished):
+    for producer in producers:
+        await asyncio.to_thread(producer.join)
+    finished.set()
+
+async def run_fully_async(handles, interval, output_path, producers,
+                          merger=None):
+    finished = asyncio.Event()
     async with WriteThread(output_path) as output:
-        tasks = []
-        for handle in handles:
-            coro = tail_async(handle, interval, output.write)
-            task = asyncio.create_task(coro)
+        def writer(source):
+            async def write(data):
+                # All tails share this loop, so the merger needs no lock.
+                lines = merger.add(source, data)
+                if lines:
+                    await output.write(b''.join(lines))
+            return write
+
+        async def tail(source, handle):
+            if merger is None:
+                await tail_async(handle, interval, output.write, finished)
+                return
+            await tail_async(handle, interval, writer(source), finished)
+            lines = merger.close(source)
+            if lines:
+                await output.write(b''.join(lines))
+
+        tasks = [asyncio.create_task(wait_for(producers, finished))]
+        for index, handle in enumerate(handles):
+            task = asyncio.create_task(tail(index, handle))
             tasks.append(task)
 
         await asyncio.gather(*tasks)
+        if merger is not None:
+            await output.write(b''.join(merger.flush()))
+
+async def run_watcher(handles, interval, output_path, producers,
+                      merger=None):
+    finished = asyncio.Event()
+    async with WriteThread(output_path) as output:
+        # One watcher on this loop for every handle, fed in blocks of
+        # whole lines.
+        def writer(source):
+            async def write(data):
+                if merger is None:
+                    await output.write(data)
+                    return
+                lines = []
+                for line in data.splitlines(keepends=True):
+                    lines.extend(merger.add(source, line))
+                if lines:
+                    await output.write(b''.join(lines))
+            return write
+
+        watcher = Watcher(handles, [writer(index)
+                                    for index in range(len(handles))],
+                          interval=interval)
+        task = asyncio.create_task(watcher.run_async())
+        await wait_for(producers, finished)
+        watcher.stop()
+        await task
+
+        if merger is not None:
+            lines = []
+            for index in range(len(handles)):
+                lines.extend(merger.close(index))
+            lines.extend(merger.flush())
+            await output.write(b''.join(lines))
+
+def confirm_merge(input_paths, output_path):
+    mismatches = verify_merge(input_paths, output_path)
+    for mismatch in mismatches:
+        print(f'{mismatch.kind} line at {mismatch.path}:{mismatch.offset} '
+              f'{mismatch.line!r}')
+    if not mismatches:
+        print(f'Merge of {len(input_paths)} files verified')
+
+def run_demo(run, count, lines, lateness=0.5):
+    directory = tempfile.mkdtemp()
+    input_paths = [os.path.join(directory, f'input{index}.log')
+                   for index in range(count)]
+    for path in input_paths:
+        open(path, 'wb').close()
+    handles = [open(path, 'rb') for path in input_paths]
+    output_path = os.path.join(directory, 'merged.log')
+
+    producers = [Thread(target=write_lines, args=(path, lines))
+                 for path in input_paths]
+    start = time.time()
+    for producer in producers:
+        producer.start()
+    merger = TimestampMerger(range(len(handles)), lateness=lateness)
+    asyncio.run(run(handles, 0.1, output_path, producers, merger))
+    end = time.time()
+    delta = end - start
+    print(f'{run.__name__} over {count} files took {delta:.3f} seconds',
+          merger.stats())
+
+    confirm_merge(input_paths, output_path)
+
+    for handle in handles:
+        handle.close()
+    shutil.rmtree(directory)
+
+run_demo(run_fully_async, 5, 100)
+run_demo(run_watcher, 5, 100)
+# A thousand producer threads starve the reader of the GIL on a small box,
+# so allow lines to arrive further behind the newest one.
+run_demo(run_watcher, 1000, 100, lateness=5.0)
+
+# Many busy writers: one hop to the write loop per line against coalesced
+# batches.
+class PerLineWriteThread(WriteThread):
+    async def real_write(self, data):
+        self.output.write(data)
+
+    async def write(self, data):
+        coro = self.real_write(data)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        await asyncio.wrap_future(future)
 
-def confirm_merge(input_path, output_path):
-    pass
+async def hammer(write_thread, output_path, writers, lines):
+    line = b'%.6f input.log 0\n' % time.time()
+    async def writer():
+        for _ in range(lines):
+            await output.write(line)
 
-input_paths = []
-handles = []
-output_paths = []
-asyncio.run(run_fully_async(handles, 0.1, output_path))
+    async with write_thread(output_path) as output:
+        await asyncio.gather(*(writer() for _ in range(writers)))
 
-confirm_merge(input_path, output_path)
+directory = tempfile.mkdtemp()
+output_path = os.path.join(directory, 'merged.log')
+for write_thread in (PerLineWriteThread, WriteThread):
+    start = time.time()
+    asyncio.run(hammer(write_thread, output_path, 100, 1000))
+    end = time.time()
+    delta = end - start
+    print(f'{write_thread.__name__}: {100 * 1000 / delta:,.0f} lines/second')
+shutil.rmtree(directory)
@@ -1,10 +1,5 @@
-def gcd(pair):
-    a, b = pair
-    low = min(a, b)
-    for i in range(low, 0, -1):
-        if a % i == 0 and b % i == 0:
-            return i
-    assert False, 'not reachable'
+from process_executor.gcd import gcd, gcd_batch
+from process_executor.pool import get_pool
 
 import time
 
@@ -21,8 +16,6 @@ def main():
     delta = end - start
     print(f'Took {delta:.3f} seconds')
 
-main()
-
 from concurrent.futures import ThreadPoolExecutor
 
 def main_threads():
@@ -33,16 +26,48 @@ def main_threads():
     delta = end - start
     print(f'Took {delta:.3f} seconds')
 
-main_threads()
-
-from concurrent.futures import ProcessPoolExecutor
-
 def main_process():
     start = time.time()
-    pool = ProcessPoolExecutor(max_workers=2)
-    results = list(pool.map(gcd, NUMBERS))
+    pool = get_pool(2)
+    results = pool.map(gcd, NUMBERS)
     end = time.time()
     delta = end - start
     print(f'Took {delta:.3f} seconds')
+    stats = pool.stats()
+    print(f'    pool start-up {stats["startup"]:.3f} seconds, '
+          f'compute {stats["compute"]:.3f} seconds, '
+          f'chunksize {stats["chunksize"]}')
+
+import random
+
+def main_batch():
+    start = time.time()
+    results = gcd_batch(NUMBERS)
+    end = time.time()
+    delta = end - start
+    assert results == list(map(gcd, NUMBERS))
+    print(f'Took {delta:.6f} seconds')
+
+def main_batch_throughput():
+    pairs = [(random.randrange(1, 10**7), random.randrange(1, 10**7))
+             for _ in range(1_000_000)]
+
+    start = time.time()
+    gcd_batch(pairs)
+    end = time.time()
+    delta = end - start
+    print(f'{len(pairs) / delta:,.0f} pairs/second in one process')
+
+    pool = get_pool(2)
+    start = time.time()
+    gcd_batch(pairs, pool=pool.executor)
+    end = time.time()
+    delta = end - start
+    print(f'{len(pairs) / delta:,.0f} pairs/second across 2 processes')
 
-main_process()
+if __name__ == '__main__':
+    main()
+    main_threads()
+    main_process()
+    main_batch()
+    main_batch_throughput()
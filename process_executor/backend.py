@@ -0,0 +1,66 @@
+import concurrent.futures
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+import os
+import sys
+from time import perf_counter
+
+
+def noop():
+    return None
+
+def gil_disabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+# Threads only run Python code in parallel without the GIL; sub-interpreters
+# each have their own GIL but share the process; processes work everywhere
+# at the price of pickling and a full interpreter per worker.
+def choose_backend():
+    if gil_disabled():
+        return 'thread'
+    if hasattr(concurrent.futures, 'InterpreterPoolExecutor'):
+        return 'interpreter'
+    return 'process'
+
+def make_executor(backend, max_workers):
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers)
+    if backend == 'interpreter':
+        return concurrent.futures.InterpreterPoolExecutor(max_workers)
+    if backend == 'process':
+        return ProcessPoolExecutor(max_workers)
+    raise ValueError(f'unknown backend {backend!r}')
+
+class CPUExecutor(Executor):
+    def __init__(self, max_workers=None, backend=None, probes=100):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.backend = backend or choose_backend()
+
+        began = perf_counter()
+        self.executor = make_executor(self.backend, self.max_workers)
+        futures = [self.executor.submit(noop) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        self.startup = perf_counter() - began
+
+        began = perf_counter()
+        for _ in range(probes):
+            self.executor.submit(noop).result()
+        self.task_overhead = (perf_counter() - began) / probes
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        return self.executor.map(fn, *iterables, timeout=timeout,
+                                 chunksize=chunksize)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.executor.shutdown(wait, cancel_futures=cancel_futures)
+
+    def stats(self):
+        return {'backend': self.backend,
+                'workers': self.max_workers,
+                'startup': self.startup,
+                'task_overhead': self.task_overhead}
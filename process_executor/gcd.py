@@ -0,0 +1,65 @@
+from array import array
+from itertools import chain
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def gcd(pair):
+    a, b = pair
+    low = min(a, b)
+    for i in range(low, 0, -1):
+        if a % i == 0 and b % i == 0:
+            return i
+    assert False, 'not reachable'
+
+# Below this many pairs the array conversion costs more than it saves.
+NUMPY_THRESHOLD = 1000
+
+def gcd_chunk(pairs):
+    if numpy is not None and len(pairs) >= NUMPY_THRESHOLD:
+        try:
+            array = numpy.asarray(pairs, dtype=numpy.int64)
+        except OverflowError:
+            pass
+        else:
+            return numpy.gcd(array[:, 0], array[:, 1]).tolist()
+    return [math.gcd(a, b) for a, b in pairs]
+
+def gcd_flat(values):
+    # Pairs laid out as a0, b0, a1, b1, ...
+    if numpy is not None:
+        values = numpy.asarray(values)
+        return numpy.gcd(values[0::2], values[1::2])
+    return array('q', map(math.gcd, values[0::2], values[1::2]))
+
+def flatten_chunks(pairs, chunk_size):
+    # A flat int64 array pickles as raw bytes; a list of tuples pickles one
+    # object at a time and costs more to send than the gcds cost to compute.
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        if numpy is not None and isinstance(chunk, numpy.ndarray):
+            yield numpy.ascontiguousarray(chunk, dtype=numpy.int64).ravel()
+        else:
+            yield array('q', chain.from_iterable(chunk))
+
+def gcd_batch(pairs, pool=None, chunk_size=250_000):
+    if pool is None or len(pairs) <= chunk_size:
+        return gcd_chunk(pairs)
+
+    try:
+        chunks = list(flatten_chunks(pairs, chunk_size))
+    except OverflowError:
+        # Beyond int64: ship the pairs as they are.
+        chunks = [pairs[i:i + chunk_size]
+                  for i in range(0, len(pairs), chunk_size)]
+        parts = pool.map(gcd_chunk, chunks)
+    else:
+        parts = pool.map(gcd_flat, chunks)
+    results = []
+    for part in parts:
+        results.extend(part if isinstance(part, list) else part.tolist())
+    return results
@@ -0,0 +1,131 @@
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import importlib
+import math
+import os
+from threading import Lock
+from time import perf_counter
+
+
+# Modules imported by each worker as it starts, so the first task does not
+# pay for them. Only library modules belong here: importing
+# process_executor.__main__ would re-run its benchmarks.
+PRELOAD = ('process_executor.gcd',)
+
+def preload(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+def ping():
+    return os.getpid()
+
+def timed_chunk(func, items):
+    began = perf_counter()
+    results = [func(item) for item in items]
+    return results, perf_counter() - began
+
+class WarmPool:
+    def __init__(self, max_workers=None, modules=PRELOAD, mp_context=None,
+                 sample_size=8, sample_fraction=8, chunk_overhead=10):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.modules = modules
+        self.mp_context = mp_context
+        self.sample_size = sample_size
+        self.sample_fraction = sample_fraction
+        # A chunk should take chunk_overhead times longer to compute than
+        # its round trip to a worker costs.
+        self.chunk_overhead = chunk_overhead
+        self.executor = None
+        self.startup = 0.0
+        self.round_trip = 0.0
+        self.compute = 0.0
+        self.chunksize = None
+
+    def start(self):
+        if self.executor is not None:
+            return self
+        began = perf_counter()
+        self.executor = ProcessPoolExecutor(
+            self.max_workers, mp_context=self.mp_context,
+            initializer=preload, initargs=(self.modules,))
+        # One ping per worker forces every process to start and finish its
+        # initializer before any real work is timed.
+        futures = [self.executor.submit(ping) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        self.startup = perf_counter() - began
+
+        began = perf_counter()
+        self.executor.submit(ping).result()
+        self.round_trip = perf_counter() - began
+        return self
+
+    def pick_chunksize(self, per_item, count):
+        if per_item <= 0:
+            wanted = count
+        else:
+            wanted = math.ceil(self.chunk_overhead * self.round_trip / per_item)
+        # Still leave a few chunks per worker so they finish together.
+        balanced = math.ceil(count / (4 * self.max_workers))
+        return max(1, min(wanted, balanced))
+
+    def map(self, func, items, chunksize=None):
+        self.start()
+        items = list(items)
+        began = perf_counter()
+        results = []
+        if chunksize is None and items:
+            # Time a small sample, spread over the workers so they stay
+            # busy, and never more than a fraction of the input; the
+            # results are kept.
+            count = min(self.sample_size,
+                        max(1, len(items) // self.sample_fraction))
+            sample = items[:count]
+            items = items[count:]
+            size = math.ceil(count / self.max_workers)
+            futures = [self.executor.submit(timed_chunk, func,
+                                            sample[start:start + size])
+                       for start in range(0, count, size)]
+            elapsed = 0.0
+            for future in futures:
+                chunk_results, chunk_elapsed = future.result()
+                results.extend(chunk_results)
+                elapsed += chunk_elapsed
+            chunksize = self.pick_chunksize(elapsed / count, len(items))
+        self.chunksize = chunksize
+        if items:
+            results.extend(self.executor.map(func, items, chunksize=chunksize))
+        self.compute += perf_counter() - began
+        return results
+
+    def stats(self):
+        return {'workers': self.max_workers,
+                'startup': self.startup,
+                'round_trip': self.round_trip,
+                'compute': self.compute,
+                'chunksize': self.chunksize}
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait)
+            self.executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+pool = None
+pool_lock = Lock()
+
+def get_pool(max_workers=None):
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = WarmPool(max_workers).start()
+            atexit.register(pool.shutdown)
+        elif max_workers is not None and max_workers != pool.max_workers:
+            raise ValueError(f'shared pool already has {pool.max_workers} '
+                             f'workers, not {max_workers}')
+        return pool
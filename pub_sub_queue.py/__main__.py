@@ -1,7 +1,24 @@
-from queue import Queue
-from threading import Thread
+import asyncio
+import os
+import random
+import statistics
+import sys
 import time
 
+# Run as a script, only this directory is on sys.path; the repository root
+# holds the process-wide executor in work_stealing.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_pipeline
+from metrics import MetricsRegistry, MetricsReporter
+from pipeline import (ClosableQueue, ErrorPolicy, PriorityClosableQueue,
+                      start_on_executor, start_threads, stop_threads)
+from process_stage import (consuming_shared, sharing_output, start_pool,
+                           start_processes)
+from runner import Pipeline, Stage
+from spill_queue import SpillingClosableQueue
+from work_stealing.executor import get_executor
+
 start = time.time()
 
 def download(item):
@@ -25,65 +42,296 @@ def upload(item):
     print(f'upload {delta}')
     return f'to{item}'
 
+async def download_async(item):
+    await asyncio.sleep(1)
+    return f'to{item}'
+
+async def resize_async(item):
+    await asyncio.sleep(1)
+    return f'to{item}'
+
+async def upload_async(item):
+    await asyncio.sleep(10)
+    return f'to{item}'
+
+def download_image(item):
+    time.sleep(0.1)
+    return os.urandom(1 << 20)
+
+def resize_image(image):
+    # Stand-in for CPU-bound image work: average neighbouring bytes.
+    return bytes((image[i] + image[i + 1]) // 2
+                 for i in range(0, len(image) - 1, 2))
+
+def upload_image(image):
+    time.sleep(0.1)
+    return len(image)
+
+
+def main_threads():
+    registry = MetricsRegistry(sample_every=1)
+    reporter = MetricsReporter(registry, 10, print)
+    reporter.start()
+
+    download_metrics = registry.stage('download')
+    resize_metrics = registry.stage('resize')
+    upload_metrics = registry.stage('upload')
+
+    download_queue = ClosableQueue(metrics=download_metrics)
+    resize_queue = ClosableQueue(metrics=resize_metrics)
+    upload_queue = ClosableQueue(metrics=upload_metrics)
+    done_queue = ClosableQueue()
+
+    download_threads = start_threads(4, download, download_queue, resize_queue,
+                                     metrics=download_metrics)
+    resize_threads = start_threads(4, resize, resize_queue, upload_queue,
+                                   metrics=resize_metrics)
+    upload_threads = start_threads(4, upload, upload_queue, done_queue,
+                                   metrics=upload_metrics)
+
+    for _ in range(10):
+        download_queue.put('titi')
+
+    stop_threads(download_queue, download_threads)
+    stop_threads(resize_queue, resize_threads)
+    stop_threads(upload_queue, upload_threads)
+
+    reporter.stop()
+    print(registry.to_prometheus())
+    print(done_queue.qsize(), 'items finalized')
+
+def run_cheap(registry, count):
+    def passthrough(item):
+        return item
+
+    names = ['download', 'resize', 'upload']
+    metrics = [registry and registry.stage(name) for name in names]
+    queues = [ClosableQueue(metrics=stage) for stage in metrics]
+    queues.append(ClosableQueue())
+
+    threads = [start_threads(4, passthrough, in_queue, out_queue, metrics=stage)
+               for stage, in_queue, out_queue
+               in zip(metrics, queues, queues[1:])]
+
+    began = time.perf_counter()
+    for item in range(count):
+        queues[0].put(item)
+    for queue, stage_threads in zip(queues, threads):
+        stop_threads(queue, stage_threads)
+    return time.perf_counter() - began
+
+def main_metrics_overhead():
+    # Worst case: stages that do no work, so every hop is pure overhead.
+    # Thread scheduling makes single runs swing by several percent, so
+    # compare back-to-back pairs and take the median, and show the same
+    # figure for two plain runs as the noise floor.
+    def median_overhead(registry_factory):
+        ratios = []
+        for _ in range(15):
+            plain = run_cheap(None, 20_000)
+            other = run_cheap(registry_factory(), 20_000)
+            ratios.append(other / plain)
+        return (statistics.median(ratios) - 1) * 100
+
+    noise = median_overhead(lambda: None)
+    overhead = median_overhead(MetricsRegistry)
+    print(f'Metrics overhead {overhead:.1f}% (noise floor {noise:.1f}%)')
+
+async def run_asyncio(stages, items, max_size, blocking_workers):
+    executor = async_pipeline.use_blocking_executor(blocking_workers)
 
-class ClosableQueue(Queue):
-    SENTINEL = object()
+    queues = [async_pipeline.ClosableQueue(max_size) for _ in stages]
+    done_queue = async_pipeline.ClosableQueue()
+    out_queues = queues[1:] + [done_queue]
 
-    def close(self):
-        self.put(self.SENTINEL)
+    tasks = []
+    for (func, count), in_queue, out_queue in zip(stages, queues, out_queues):
+        tasks.append(async_pipeline.start_tasks(count, func, in_queue, out_queue))
 
-    def __iter__(self):
-        while True:
-            item = self.get()
-            try:
-                if item is self.SENTINEL:
-                    return
-                yield item
-            finally:
-                self.task_done()
+    for item in items:
+        await queues[0].put(item)
 
-class StoppableWorker(Thread):
-    def __init__(self, func, in_queue, out_queue):
-        super().__init__()
-        self.func = func
-        self.in_queue = in_queue
-        self.out_queue = out_queue
+    for queue, stage_tasks in zip(queues, tasks):
+        await async_pipeline.stop_tasks(queue, stage_tasks)
 
-    def run(self):
-        for item in self.in_queue:
-            result = self.func(item)
-            self.out_queue.put(result)
+    executor.shutdown()
+    print(done_queue.qsize(), 'items finalized')
 
-def start_threads(count, *args):
-    threads = [StoppableWorker(*args) for _ in range(count)]
-    for thread in threads:
-        thread.start()
-    return threads
+def main_priority():
+    def upload_quick(item):
+        time.sleep(0.1)
+        return item, time.monotonic()
 
-def stop_threads(closable_queue, threads):
-    for _ in threads:
-        closable_queue.close()
+    shed_queue = ClosableQueue()
+    upload_queue = PriorityClosableQueue(side_queue=shed_queue)
+    done_queue = ClosableQueue()
 
-    closable_queue.join()
+    # Hold the workers back until the backlog is queued so the urgent item
+    # really is behind the bulk ones.
+    for index in range(100):
+        upload_queue.put(f'bulk{index}', priority=1)
+    now = time.monotonic()
+    for index in range(10):
+        upload_queue.put(f'expiring{index}', priority=1, deadline=now + 0.05)
+    upload_queue.put('urgent', priority=0, deadline=now + 0.5)
 
-    for thread in threads:
-        thread.join()
+    queued = time.monotonic()
+    upload_threads = start_threads(4, upload_quick, upload_queue, done_queue)
+    stop_threads(upload_queue, upload_threads)
 
+    finished = dict(done_queue.queue)
+    print(f'urgent uploaded after {finished["urgent"] - queued:.3f} seconds')
+    print(upload_queue.stats(), shed_queue.qsize(), 'items diverted')
 
-download_queue = ClosableQueue()
-resize_queue = ClosableQueue()
-upload_queue = ClosableQueue()
-done_queue = ClosableQueue()
+def main_failures():
+    def upload_flaky(item):
+        time.sleep(0.1)
+        if item == 'poison':
+            raise ValueError('cannot upload this')
+        if random.random() < 0.2:
+            raise OSError('connection reset')
+        return item
 
-download_threads = start_threads(4, download, download_queue, resize_queue)
-resize_threads = start_threads(4, resize, resize_queue, upload_queue)
-upload_threads = start_threads(4, upload, upload_queue, done_queue)
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+    dead_queue = ClosableQueue()
+    policy = ErrorPolicy(retries=5, backoff=0.05, retry_on=(OSError,),
+                         dead_letter_queue=dead_queue)
 
-for _ in range(10):
-    download_queue.put('titi')
+    upload_threads = start_threads(4, upload_flaky, upload_queue, done_queue,
+                                   policy=policy)
+    for index in range(40):
+        upload_queue.put(f'item{index}')
+    upload_queue.put('poison')
+    stop_threads(upload_queue, upload_threads)
 
-stop_threads(download_queue, download_threads)
-stop_threads(resize_queue, resize_threads)
-stop_threads(upload_queue, upload_threads)
+    print(done_queue.qsize(), 'items finalized')
+    for letter in dead_queue.queue:
+        print(f'dead letter from {letter.stage}: {letter.item} '
+              f'({letter.error!r} after {letter.attempts} attempts)')
 
-print(done_queue.qsize(), 'items finalized')
+def main_spill():
+    def upload_stalled(item):
+        time.sleep(0.001)
+        return len(item)
+
+    upload_queue = SpillingClosableQueue(high_water=1000, segment_size=16 << 20)
+    done_queue = ClosableQueue()
+    upload_threads = start_threads(4, upload_stalled, upload_queue, done_queue)
+
+    # A burst far faster than upload can drain: producers never block and
+    # only high_water items stay in RAM.
+    for _ in range(20_000):
+        upload_queue.put(os.urandom(1024))
+    print('after burst', upload_queue.stats())
+
+    stop_threads(upload_queue, upload_threads)
+    print('after drain', upload_queue.stats())
+    print(done_queue.qsize(), 'items finalized')
+    upload_queue.dispose()
+
+def main_fusion():
+    # The cheap chain from thread_and_queues_101: the hops cost more than
+    # the work, so the runner should fold all three stages together.
+    def download_cheap(item):
+        return 'download'
+
+    def resize_cheap(item):
+        return 'resize'
+
+    def upload_cheap(item):
+        return 'upload'
+
+    for fuse_below in (0, 100e-6):
+        pipeline = Pipeline([Stage('download', download_cheap, 2),
+                             Stage('resize', resize_cheap, 2),
+                             Stage('upload', upload_cheap, 2)],
+                            fuse_below=fuse_below, interval=0.1)
+        pipeline.start()
+        began = time.perf_counter()
+        for _ in range(100_000):
+            pipeline.put('titi')
+        pipeline.stop()
+        delta = time.perf_counter() - began
+        print(f'fuse_below={fuse_below}: {delta:.3f} seconds, '
+              f'stages {pipeline.groups()}')
+        for snapshot in pipeline.registry.snapshot():
+            print(f'    {snapshot["stage"]}: {snapshot["items"]} items, '
+                  f'{snapshot["service_mean"] * 1e6:.2f} us each')
+
+def main_processes():
+    download_queue = ClosableQueue()
+    resize_queue = ClosableQueue()
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+
+    with start_pool(4) as pool:
+        download_threads = start_threads(
+            4, sharing_output(download_image), download_queue, resize_queue)
+        resize_threads = start_processes(
+            4, pool, resize_image, resize_queue, upload_queue)
+        upload_threads = start_threads(
+            4, consuming_shared(upload_image), upload_queue, done_queue)
+
+        for _ in range(10):
+            download_queue.put('titi')
+
+        stop_threads(download_queue, download_threads)
+        stop_threads(resize_queue, resize_threads)
+        stop_threads(upload_queue, upload_threads)
+
+    print(done_queue.qsize(), 'items finalized')
+
+def main_shared_executor():
+    # Resize and upload run on the process-wide work-stealing pool that the
+    # gof engines use too, instead of owning 8 threads of their own; each
+    # dispatcher keeps at most 4 items of its stage in the pool.
+    def resize_quick(item):
+        time.sleep(0.1)
+        return item
+
+    def upload_quick(item):
+        time.sleep(0.1)
+        return item
+
+    executor = get_executor()
+    download_queue = ClosableQueue()
+    resize_queue = ClosableQueue()
+    upload_queue = ClosableQueue()
+    done_queue = ClosableQueue()
+
+    download_threads = start_threads(4, download, download_queue, resize_queue)
+    resize_threads = start_on_executor(4, executor, resize_quick,
+                                       resize_queue, upload_queue)
+    upload_threads = start_on_executor(4, executor, upload_quick,
+                                       upload_queue, done_queue)
+
+    for _ in range(10):
+        download_queue.put('titi')
+
+    stop_threads(download_queue, download_threads)
+    stop_threads(resize_queue, resize_threads)
+    stop_threads(upload_queue, upload_threads)
+
+    print(done_queue.qsize(), 'items finalized on',
+          len(executor.workers), 'shared workers')
+
+def main_asyncio():
+    # Same workload and stage widths as main_threads(), with the blocking
+    # functions sharing one executor instead of owning 12 threads.
+    stages = [(download, 4), (resize, 4), (upload, 4)]
+    asyncio.run(run_asyncio(stages, ['titi'] * 10, 100, 12))
+
+def main_asyncio_scale():
+    stages = [(download_async, 1000), (resize_async, 1000), (upload_async, 1000)]
+    asyncio.run(run_asyncio(stages, ['titi'] * 1000, 1000, 4))
+
+
+for main in (main_threads, main_metrics_overhead, main_priority, main_failures,
+             main_spill, main_fusion, main_processes, main_shared_executor,
+             main_asyncio, main_asyncio_scale):
+    start = time.time()
+    main()
+    end = time.time()
+    delta = end - start
+    print(f'{main.__name__} took {delta:.3f} seconds')
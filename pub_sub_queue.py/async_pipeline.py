@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import inspect
+
+
+# Same shape as pipeline.py so a deployment can swap one module for the
+# other: coroutine stages run on the event loop, blocking stages are moved
+# to the loop's default executor, which use_blocking_executor() bounds.
+class ClosableQueue(asyncio.Queue):
+    SENTINEL = object()
+
+    async def close(self):
+        await self.put(self.SENTINEL)
+
+    async def __aiter__(self):
+        while True:
+            item = await self.get()
+            try:
+                if item is self.SENTINEL:
+                    return
+                yield item
+            finally:
+                self.task_done()
+
+class StoppableWorker:
+    def __init__(self, func, in_queue, out_queue):
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.blocking = not inspect.iscoroutinefunction(func)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        async for item in self.in_queue:
+            if self.blocking:
+                result = await asyncio.to_thread(self.func, item)
+            else:
+                result = await self.func(item)
+            await self.out_queue.put(result)
+
+    async def join(self):
+        await self.task
+
+def use_blocking_executor(max_workers):
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(executor)
+    return executor
+
+def start_tasks(count, *args):
+    tasks = [StoppableWorker(*args) for _ in range(count)]
+    for task in tasks:
+        task.start()
+    return tasks
+
+async def stop_tasks(closable_queue, tasks):
+    for _ in tasks:
+        await closable_queue.close()
+
+    await closable_queue.join()
+
+    for task in tasks:
+        await task.join()
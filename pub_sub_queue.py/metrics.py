@@ -0,0 +1,203 @@
+from bisect import bisect_left
+from itertools import cycle
+import json
+from threading import Event, Lock, Thread
+import time
+
+
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(28))
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            yield bound, seen
+
+# Each worker (and each queue, under its own mutex) writes to a private
+# shard, so recording an observation never takes a shared lock; snapshots
+# merge the shards. Only one item in `sample_every` is timed. Workers count
+# every item; queues only step `stamps`, a cycle that says when to stamp,
+# so an unsampled put writes nothing at all.
+class Shard:
+    def __init__(self, sample_every):
+        self.sample_every = sample_every
+        self.items = 0
+        self.stamps = cycle((False,) * (sample_every - 1) + (True,))
+        self.shed = 0
+        self.service = Histogram()
+        self.wait = Histogram()
+
+    def observe_service(self, seconds):
+        self.service.observe(seconds)
+
+    def observe_wait(self, seconds):
+        self.wait.observe(seconds)
+
+class Stamped:
+    __slots__ = ('enqueued', 'item')
+
+    def __init__(self, enqueued, item):
+        self.enqueued = enqueued
+        self.item = item
+
+def merge(histograms):
+    merged = Histogram()
+    for hist in histograms:
+        merged.counts = [a + b for a, b in zip(merged.counts, hist.counts)]
+        merged.count += hist.count
+        merged.sum += hist.sum
+    return merged
+
+class StageMetrics:
+    def __init__(self, name, sample_every=64):
+        self.name = name
+        self.sample_every = sample_every
+        self.lock = Lock()
+        self.workers = 0
+        self.shards = []
+        self.started = time.perf_counter()
+
+    def shard(self, worker=True):
+        shard = Shard(self.sample_every)
+        with self.lock:
+            if worker:
+                self.workers += 1
+            self.shards.append(shard)
+        return shard
+
+    def retire(self):
+        # A dead worker's shard keeps its counts, but a replacement takes
+        # over its share of the capacity.
+        with self.lock:
+            self.workers -= 1
+
+    def totals(self):
+        with self.lock:
+            shards = list(self.shards)
+        items = sum(shard.items for shard in shards)
+        service = merge(shard.service for shard in shards)
+        wait = merge(shard.wait for shard in shards)
+        busy = service.sum * items / service.count if service.count else 0.0
+        return items, busy, service, wait
+
+    def shed(self):
+        with self.lock:
+            return sum(shard.shed for shard in self.shards)
+
+    def snapshot(self):
+        items, busy, service, wait = self.totals()
+        elapsed = time.perf_counter() - self.started
+        capacity = elapsed * max(self.workers, 1)
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'items': items,
+            'shed': self.shed(),
+            'items_per_sec': items / elapsed if elapsed else 0.0,
+            'service_p50': service.quantile(0.5),
+            'service_p95': service.quantile(0.95),
+            'service_mean': busy / items if items else 0.0,
+            'wait_p50': wait.quantile(0.5),
+            'wait_p95': wait.quantile(0.95),
+            'utilization': busy / capacity if capacity else 0.0,
+        }
+
+class MetricsRegistry:
+    def __init__(self, sample_every=64):
+        self.sample_every = sample_every
+        self.lock = Lock()
+        self.stages = {}
+
+    def stage(self, name):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name, self.sample_every)
+            return self.stages[name]
+
+    def snapshot(self):
+        with self.lock:
+            stages = list(self.stages.values())
+        return [stage.snapshot() for stage in stages]
+
+    def to_json(self):
+        return json.dumps({'time': time.time(), 'stages': self.snapshot()})
+
+    def to_prometheus(self):
+        with self.lock:
+            stages = list(self.stages.values())
+
+        lines = []
+        def histogram(name, label, hist):
+            for bound, seen in hist.cumulative():
+                le = '+Inf' if bound == float('inf') else f'{bound:.6g}'
+                lines.append(f'{name}_bucket{{{label},le="{le}"}} {seen}')
+            lines.append(f'{name}_sum{{{label}}} {hist.sum}')
+            lines.append(f'{name}_count{{{label}}} {hist.count}')
+
+        totals = [(f'stage="{stage.name}"', stage.totals(), stage.snapshot())
+                  for stage in stages]
+        lines.append('# TYPE pipeline_stage_items_total counter')
+        for label, (items, _, _, _), _ in totals:
+            lines.append(f'pipeline_stage_items_total{{{label}}} {items}')
+        lines.append('# TYPE pipeline_stage_shed_total counter')
+        for label, _, snapshot in totals:
+            lines.append(f'pipeline_stage_shed_total{{{label}}} '
+                         f'{snapshot["shed"]}')
+        lines.append('# TYPE pipeline_stage_utilization gauge')
+        for label, _, snapshot in totals:
+            lines.append(f'pipeline_stage_utilization{{{label}}} '
+                         f'{snapshot["utilization"]}')
+        lines.append('# TYPE pipeline_stage_service_seconds histogram')
+        for label, (_, _, service, _), _ in totals:
+            histogram('pipeline_stage_service_seconds', label, service)
+        lines.append('# TYPE pipeline_stage_queue_wait_seconds histogram')
+        for label, (_, _, _, wait), _ in totals:
+            histogram('pipeline_stage_queue_wait_seconds', label, wait)
+        return '\n'.join(lines) + '\n'
+
+class MetricsReporter(Thread):
+    def __init__(self, registry, interval, write, format='json'):
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self.write = write
+        self.format = format
+        self.stopped = Event()
+
+    def dump(self):
+        if self.format == 'prometheus':
+            self.write(self.registry.to_prometheus())
+        else:
+            self.write(self.registry.to_json() + '\n')
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+        self.dump()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,383 @@
+from collections import namedtuple
+from heapq import heappop, heappush
+from itertools import count
+from queue import Empty, Queue
+from random import random
+import sys
+from threading import BoundedSemaphore, Lock, Thread, Timer
+from time import monotonic, perf_counter, sleep
+
+from metrics import Stamped
+
+
+class ClosableQueue(Queue):
+    SENTINEL = object()
+
+    def __init__(self, maxsize=0, metrics=None):
+        super().__init__(maxsize)
+        self.metrics = None if metrics is None else metrics.shard(worker=False)
+
+    def _put(self, item):
+        metrics = self.metrics
+        if metrics is not None and next(metrics.stamps):
+            item = Stamped(perf_counter(), item)
+        self.queue.append(item)
+
+    def _get(self):
+        item = self.queue.popleft()
+        if type(item) is Stamped:
+            self.metrics.observe_wait(perf_counter() - item.enqueued)
+            item = item.item
+        return item
+
+    def close(self):
+        self.put(self.SENTINEL)
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            try:
+                if item is self.SENTINEL:
+                    return
+                yield item
+            finally:
+                self.task_done()
+
+# Orders by (priority, deadline, arrival); lower values first. Deadlines are
+# time.monotonic() timestamps, and items whose deadline has passed by the time
+# a consumer reaches them are diverted to side_queue (or dropped) instead of
+# being returned.
+class PriorityClosableQueue(ClosableQueue):
+    def __init__(self, maxsize=0, metrics=None, side_queue=None):
+        super().__init__(maxsize, metrics)
+        self.side_queue = side_queue
+        self.sequence = count()
+        self.delivered = 0
+        self.shed = 0
+
+    def _init(self, maxsize):
+        self.queue = []
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, entry):
+        priority, deadline, item = entry
+        metrics = self.metrics
+        if metrics is not None and next(metrics.stamps):
+            item = Stamped(perf_counter(), item)
+        heappush(self.queue, (priority, deadline, next(self.sequence), item))
+
+    def _get(self):
+        _, deadline, _, item = heappop(self.queue)
+        if type(item) is Stamped:
+            self.metrics.observe_wait(perf_counter() - item.enqueued)
+            item = item.item
+        return deadline, item
+
+    def put(self, item, block=True, timeout=None, priority=0, deadline=None):
+        if deadline is None:
+            deadline = float('inf')
+        super().put((priority, deadline, item), block, timeout)
+
+    def get(self, block=True, timeout=None):
+        while True:
+            deadline, item = super().get(block, timeout)
+            if item is self.SENTINEL:
+                return item
+            if deadline >= monotonic():
+                with self.mutex:
+                    self.delivered += 1
+                return item
+
+            with self.mutex:
+                self.shed += 1
+                if self.metrics is not None:
+                    self.metrics.shed += 1
+            if self.side_queue is not None:
+                self.side_queue.put(item)
+            self.task_done()
+
+    def close(self):
+        self.put(self.SENTINEL, priority=float('inf'))
+
+    def stats(self):
+        with self.mutex:
+            return {'delivered': self.delivered, 'shed': self.shed}
+
+DeadLetter = namedtuple('DeadLetter', ['stage', 'item', 'error', 'attempts'])
+
+class ErrorPolicy:
+    def __init__(self, retries=0, backoff=0.1, max_backoff=30.0, jitter=0.5,
+                 retry_on=(Exception,), dead_letter_queue=None,
+                 max_restarts=10):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.dead_letter_queue = dead_letter_queue
+        self.max_restarts = max_restarts
+
+    def should_retry(self, error, attempts):
+        return attempts <= self.retries and isinstance(error, self.retry_on)
+
+    def delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * (1 - self.jitter * random())
+
+    def dead_letter(self, stage, item, error, attempts):
+        if self.dead_letter_queue is None:
+            print(f'{stage}: dropped {item!r} after {attempts} attempts: '
+                  f'{error!r}', file=sys.stderr)
+        else:
+            self.dead_letter_queue.put(DeadLetter(stage, item, error, attempts))
+
+# Guards a worker's gone and sentinel_sent flags, so a worker dying while
+# stop_threads sends sentinels knows whether one was counted for it.
+slots_lock = Lock()
+
+# A failing item is parked on the worker's own retry heap and the worker goes
+# back to the queue, so backoff delays only that item. task_done is called
+# once the item is delivered or dead-lettered, never earlier, so join() keeps
+# its meaning. If the worker itself dies, the item that killed it is
+# dead-lettered and a replacement inherits its parked retries and takes its
+# place in the list returned by start_threads. Past max_restarts, or
+# outside start_threads, there is no replacement: the parked retries are
+# dead-lettered too and the worker is marked gone.
+class StoppableWorker(Thread):
+    def __init__(self, func, in_queue, out_queue, metrics=None, policy=None):
+        super().__init__()
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stage_metrics = metrics
+        self.metrics = None if metrics is None else metrics.shard()
+        self.policy = ErrorPolicy() if policy is None else policy
+        self.stage = getattr(func, '__name__', repr(func))
+        self.retries = []
+        self.sequence = count()
+        self.stopping = False
+        self.siblings = None
+        self.restarts = 0
+        self.gone = False
+        self.sentinel_sent = False
+
+    def call(self, item):
+        return self.func(item)
+
+    def emit(self, result):
+        self.out_queue.put(result)
+
+    def delivered(self, item):
+        pass
+
+    def dead_letter(self, item, error, attempts):
+        self.policy.dead_letter(self.stage, item, error, attempts)
+
+    def attempt(self, item, attempts):
+        parked = False
+        try:
+            metrics = self.metrics
+            try:
+                if metrics is None:
+                    result = self.call(item)
+                else:
+                    metrics.items += 1
+                    if metrics.items % metrics.sample_every:
+                        result = self.call(item)
+                    else:
+                        began = perf_counter()
+                        result = self.call(item)
+                        metrics.observe_service(perf_counter() - began)
+            except Exception as error:
+                attempts += 1
+                if self.policy.should_retry(error, attempts):
+                    due = monotonic() + self.policy.delay(attempts)
+                    entry = (due, next(self.sequence), attempts, item, error)
+                    heappush(self.retries, entry)
+                    parked = True
+                else:
+                    self.dead_letter(item, error, attempts)
+                return
+            except BaseException as error:
+                # The worker dies with this one; the item must not.
+                self.dead_letter(item, error, attempts + 1)
+                raise
+            self.emit(result)
+            self.delivered(item)
+        finally:
+            if not parked:
+                self.in_queue.task_done()
+
+    def retry_due(self):
+        _, _, attempts, item, _ = heappop(self.retries)
+        self.attempt(item, attempts)
+
+    def work(self):
+        while self.retries or not self.stopping:
+            timeout = None
+            if self.retries:
+                timeout = max(self.retries[0][0] - monotonic(), 0)
+            if self.stopping:
+                sleep(timeout)
+                self.retry_due()
+                continue
+            try:
+                item = self.in_queue.get(timeout=timeout)
+            except Empty:
+                self.retry_due()
+                continue
+            if item is self.in_queue.SENTINEL:
+                self.stopping = True
+                self.in_queue.task_done()
+                continue
+            self.attempt(item, 0)
+
+    def clone(self):
+        return type(self)(self.func, self.in_queue, self.out_queue,
+                          self.stage_metrics, self.policy)
+
+    def replace(self):
+        if self.stage_metrics is not None:
+            self.stage_metrics.retire()
+        replacement = None
+        with slots_lock:
+            self.gone = True
+            if (self.siblings is not None
+                    and self.restarts < self.policy.max_restarts):
+                replacement = self.clone()
+                replacement.retries = self.retries
+                replacement.stopping = self.stopping
+                replacement.sentinel_sent = self.sentinel_sent
+                replacement.siblings = self.siblings
+                replacement.restarts = self.restarts + 1
+                self.siblings.append(replacement)
+            # A sentinel already sent for this worker will never be read.
+            owed = self.sentinel_sent and not self.stopping
+            last = not any(not thread.gone for thread in self.siblings or ())
+        if replacement is not None:
+            replacement.start()
+            return
+        # Nobody takes over, so settle what this worker owes the queue.
+        while self.retries:
+            _, _, attempts, item, error = heappop(self.retries)
+            try:
+                self.dead_letter(item, error, attempts)
+            finally:
+                self.in_queue.task_done()
+        if owed:
+            self.in_queue.task_done()
+        if last:
+            self.abandon()
+
+    def abandon(self):
+        # The stage has no workers left: whatever is still queued would
+        # never be taken, so dead-letter it rather than hang join().
+        error = RuntimeError(f'{self.stage}: no workers left')
+        while True:
+            try:
+                item = self.in_queue.get_nowait()
+            except Empty:
+                return
+            try:
+                if item is not self.in_queue.SENTINEL:
+                    self.dead_letter(item, error, 0)
+            finally:
+                self.in_queue.task_done()
+
+    def run(self):
+        try:
+            self.work()
+        except BaseException:
+            self.replace()
+            raise
+
+# Runs a stage on a shared executor (for example the process-wide
+# work-stealing pool) instead of on its own threads: one dispatcher thread
+# feeds at most `count` items at a time into the executor. A failed item
+# keeps its slot and is resubmitted by a timer once its backoff is over, so
+# no executor thread sleeps through it; task_done still waits for delivery
+# or dead-lettering.
+class ExecutorWorker(Thread):
+    def __init__(self, func, in_queue, out_queue, executor, count,
+                 policy=None):
+        super().__init__()
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.executor = executor
+        self.count = count
+        self.slots = BoundedSemaphore(count)
+        self.policy = ErrorPolicy() if policy is None else policy
+        self.stage = getattr(func, '__name__', repr(func))
+        self.gone = False
+        self.sentinel_sent = False
+
+    def submit(self, item, attempts):
+        future = self.executor.submit(self.func, item)
+        future.add_done_callback(
+            lambda future: self.finish(future, item, attempts))
+
+    def finish(self, future, item, attempts):
+        done = True
+        try:
+            error = future.exception()
+            if error is None:
+                self.out_queue.put(future.result())
+                return
+            attempts += 1
+            if self.policy.should_retry(error, attempts):
+                timer = Timer(self.policy.delay(attempts), self.submit,
+                              (item, attempts))
+                timer.daemon = True
+                timer.start()
+                done = False
+            else:
+                self.policy.dead_letter(self.stage, item, error, attempts)
+        finally:
+            if done:
+                self.in_queue.task_done()
+                self.slots.release()
+
+    def run(self):
+        while True:
+            item = self.in_queue.get()
+            if item is self.in_queue.SENTINEL:
+                for _ in range(self.count):
+                    self.slots.acquire()
+                for _ in range(self.count):
+                    self.slots.release()
+                self.in_queue.task_done()
+                return
+            self.slots.acquire()
+            self.submit(item, 0)
+
+def start_on_executor(count, executor, func, in_queue, out_queue,
+                      policy=None):
+    thread = ExecutorWorker(func, in_queue, out_queue, executor, count, policy)
+    thread.start()
+    return [thread]
+
+def start_threads(count, *args, **kwargs):
+    threads = [StoppableWorker(*args, **kwargs) for _ in range(count)]
+    for thread in threads:
+        thread.siblings = threads
+        thread.start()
+    return threads
+
+def stop_threads(closable_queue, threads):
+    # Crashed workers hand their slot to a replacement appended to threads,
+    # or give it up; there is one sentinel per live slot and the join loop
+    # picks up late arrivals.
+    with slots_lock:
+        live = [thread for thread in threads if not thread.gone]
+        for thread in live:
+            thread.sentinel_sent = True
+    for _ in live:
+        closable_queue.close()
+
+    closable_queue.join()
+
+    for thread in threads:
+        thread.join()
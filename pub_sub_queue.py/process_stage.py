@@ -0,0 +1,119 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from multiprocessing import resource_tracker, shared_memory
+
+from pipeline import StoppableWorker
+
+
+# Only the block name and payload size cross the queues and the process
+# boundary; the bytes themselves stay in shared memory.
+SharedPayload = namedtuple('SharedPayload', ['name', 'size'])
+
+def share(data):
+    view = memoryview(data)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    view = view.cast('B')
+    block = shared_memory.SharedMemory(create=True, size=max(view.nbytes, 1))
+    try:
+        block.buf[:view.nbytes] = view
+        return SharedPayload(block.name, view.nbytes)
+    except BaseException:
+        block.unlink()
+        raise
+    finally:
+        view.release()
+        block.close()
+
+@contextmanager
+def open_payload(handle):
+    block = shared_memory.SharedMemory(name=handle.name)
+    view = block.buf[:handle.size]
+    try:
+        yield view
+    finally:
+        view.release()
+        block.close()
+
+def release(handle):
+    try:
+        block = shared_memory.SharedMemory(name=handle.name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+def load(handle):
+    try:
+        with open_payload(handle) as view:
+            return bytes(view)
+    finally:
+        release(handle)
+
+def run_shared(func, handle):
+    with open_payload(handle) as view:
+        result = func(view)
+        try:
+            return share(result)
+        finally:
+            del result
+
+def sharing_output(func):
+    @wraps(func)
+    def wrapper(item):
+        return share(func(item))
+    return wrapper
+
+def consuming_shared(func):
+    @wraps(func)
+    def wrapper(handle):
+        try:
+            with open_payload(handle) as view:
+                return func(view)
+        finally:
+            release(handle)
+    return wrapper
+
+# Fork every pool worker before any pipeline thread exists: a child forked
+# while another thread holds the resource tracker's lock (taken whenever a
+# block is created) deadlocks on its first share().
+def start_pool(max_workers):
+    resource_tracker.ensure_running()
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    pool.submit(int).result()
+    return pool
+
+class ProcessWorker(StoppableWorker):
+    def __init__(self, func, in_queue, out_queue, pool, metrics=None,
+                 policy=None):
+        super().__init__(func, in_queue, out_queue, metrics, policy)
+        self.pool = pool
+
+    def call(self, handle):
+        future = self.pool.submit(run_shared, self.func, handle)
+        return future.result()
+
+    def delivered(self, handle):
+        release(handle)
+
+    def dead_letter(self, handle, error, attempts):
+        # A dead-lettered handle is owned by whoever drains the dead letter
+        # queue; with nobody to hand it to, free the block here.
+        if self.policy.dead_letter_queue is None:
+            release(handle)
+        super().dead_letter(handle, error, attempts)
+
+    def clone(self):
+        return type(self)(self.func, self.in_queue, self.out_queue, self.pool,
+                          self.stage_metrics, self.policy)
+
+def start_processes(count, pool, func, in_queue, out_queue, metrics=None,
+                    policy=None):
+    threads = [ProcessWorker(func, in_queue, out_queue, pool, metrics, policy)
+               for _ in range(count)]
+    for thread in threads:
+        thread.siblings = threads
+        thread.start()
+    return threads
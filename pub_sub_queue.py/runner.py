@@ -0,0 +1,134 @@
+from threading import Event, Thread
+from time import perf_counter
+
+from metrics import MetricsRegistry
+from pipeline import ClosableQueue, StoppableWorker, stop_threads
+
+
+class Stage:
+    def __init__(self, name, func, count=1, policy=None):
+        self.name = name
+        self.func = func
+        self.count = count
+        self.policy = policy
+
+# While fused[index] is set, a worker of stage `index` runs stage index + 1
+# itself instead of queueing the result for it. Each downstream call is still
+# timed against its own stage, and an item that fails there is handed to that
+# stage's queue so its own workers apply its retry and dead-letter policy.
+class FusingWorker(StoppableWorker):
+    def __init__(self, pipeline, index):
+        stage = pipeline.stages[index]
+        super().__init__(stage.func, pipeline.queues[index],
+                         pipeline.out_queues[index],
+                         pipeline.registry.stage(stage.name), stage.policy)
+        self.pipeline = pipeline
+        self.index = index
+        self.downstream = {}
+
+    def shard(self, index):
+        if index not in self.downstream:
+            name = self.pipeline.stages[index].name
+            metrics = self.pipeline.registry.stage(name)
+            self.downstream[index] = metrics.shard(worker=False)
+        return self.downstream[index]
+
+    def emit(self, result):
+        pipeline = self.pipeline
+        index = self.index
+        while index + 1 < len(pipeline.stages) and pipeline.fused[index]:
+            index += 1
+            shard = self.shard(index)
+            shard.items += 1
+            began = perf_counter()
+            try:
+                next_result = pipeline.stages[index].func(result)
+            except Exception:
+                pipeline.queues[index].put(result)
+                return
+            if shard.items % shard.sample_every == 0:
+                shard.observe_service(perf_counter() - began)
+            result = next_result
+        pipeline.out_queues[index].put(result)
+
+    def clone(self):
+        return type(self)(self.pipeline, self.index)
+
+class FusionPlanner(Thread):
+    def __init__(self, pipeline, interval):
+        super().__init__(daemon=True)
+        self.pipeline = pipeline
+        self.interval = interval
+        self.stopped = Event()
+        self.previous = {}
+
+    def recent_service(self, stage):
+        metrics = self.pipeline.registry.stage(stage.name)
+        _, _, service, _ = metrics.totals()
+        count, total = self.previous.get(stage.name, (0, 0.0))
+        self.previous[stage.name] = (service.count, service.sum)
+        if service.count == count:
+            return None
+        return (service.sum - total) / (service.count - count)
+
+    def plan(self):
+        pipeline = self.pipeline
+        service = [self.recent_service(stage) for stage in pipeline.stages]
+        for index in range(len(pipeline.fused)):
+            pair = service[index], service[index + 1]
+            if None in pair:
+                continue
+            if pipeline.fused[index]:
+                if max(pair) > pipeline.split_above:
+                    pipeline.fused[index] = False
+            elif max(pair) < pipeline.fuse_below:
+                pipeline.fused[index] = True
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.plan()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+class Pipeline:
+    def __init__(self, stages, registry=None, fuse_below=100e-6,
+                 split_above=None, interval=0.5):
+        self.stages = stages
+        self.registry = MetricsRegistry() if registry is None else registry
+        self.fuse_below = fuse_below
+        self.split_above = 2 * fuse_below if split_above is None else split_above
+        self.fused = [False] * (len(stages) - 1)
+        self.queues = [ClosableQueue(metrics=self.registry.stage(stage.name))
+                       for stage in stages]
+        self.done_queue = ClosableQueue()
+        self.out_queues = self.queues[1:] + [self.done_queue]
+        self.threads = []
+        self.planner = FusionPlanner(self, interval)
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            threads = [FusingWorker(self, index) for _ in range(stage.count)]
+            for thread in threads:
+                thread.siblings = threads
+                thread.start()
+            self.threads.append(threads)
+        self.planner.start()
+
+    def put(self, item):
+        self.queues[0].put(item)
+
+    def groups(self):
+        groups = [[self.stages[0].name]]
+        for fused, stage in zip(self.fused, self.stages[1:]):
+            if fused:
+                groups[-1].append(stage.name)
+            else:
+                groups.append([stage.name])
+        return groups
+
+    def stop(self):
+        for queue, threads in zip(self.queues, self.threads):
+            stop_threads(queue, threads)
+        self.planner.stop()
@@ -0,0 +1,137 @@
+from collections import deque
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import weakref
+
+from metrics import Stamped
+from pipeline import ClosableQueue
+
+
+HEADER = struct.Struct('<IB')
+ITEM = 0
+SENTINEL = 1
+
+class Segment:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.write_offset = 0
+        self.read_offset = 0
+
+    def append(self, kind, data):
+        end = self.write_offset + HEADER.size + len(data)
+        if end > self.size:
+            return False
+        HEADER.pack_into(self.map, self.write_offset, len(data), kind)
+        self.map[self.write_offset + HEADER.size:end] = data
+        self.write_offset = end
+        return True
+
+    def pop(self):
+        length, kind = HEADER.unpack_from(self.map, self.read_offset)
+        start = self.read_offset + HEADER.size
+        data = self.map[start:start + length]
+        self.read_offset = start + length
+        return kind, data
+
+    def consumed(self):
+        return self.read_offset == self.write_offset
+
+    def delete(self):
+        self.map.close()
+        os.unlink(self.path)
+
+# Stands in for the deque behind Queue: the first high_water items live in
+# memory, everything after them is pickled into mmap'd segment files. Once
+# anything is on disk, new items go to disk too, so FIFO order holds.
+class SpillBuffer:
+    def __init__(self, high_water, directory, segment_size, sentinel):
+        self.memory = deque()
+        self.segments = deque()
+        self.high_water = high_water
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sentinel = sentinel
+        self.spilled = 0
+        self.created = 0
+
+    def __len__(self):
+        return len(self.memory) + self.spilled
+
+    def new_segment(self, needed):
+        path = os.path.join(self.directory, f'{self.created:08d}.seg')
+        self.created += 1
+        segment = Segment(path, max(self.segment_size, needed))
+        self.segments.append(segment)
+        return segment
+
+    def append(self, item):
+        if not self.spilled and len(self.memory) < self.high_water:
+            self.memory.append(item)
+            return
+
+        if type(item) is Stamped and item.item is self.sentinel:
+            item = self.sentinel
+        if item is self.sentinel:
+            kind, data = SENTINEL, b''
+        else:
+            kind, data = ITEM, pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        if not self.segments or not self.segments[-1].append(kind, data):
+            segment = self.new_segment(HEADER.size + len(data))
+            segment.append(kind, data)
+        self.spilled += 1
+
+    def popleft(self):
+        if self.memory:
+            return self.memory.popleft()
+        if not self.spilled:
+            raise IndexError('pop from an empty queue')
+
+        segment = self.segments[0]
+        kind, data = segment.pop()
+        self.spilled -= 1
+        if segment.consumed():
+            self.segments.popleft().delete()
+
+        if kind == SENTINEL:
+            return self.sentinel
+        return pickle.loads(data)
+
+    def dispose(self):
+        while self.segments:
+            self.segments.popleft().delete()
+
+class SpillingClosableQueue(ClosableQueue):
+    def __init__(self, high_water=10_000, directory=None,
+                 segment_size=64 << 20, maxsize=0, metrics=None):
+        self.high_water = high_water
+        self.directory = tempfile.mkdtemp(prefix='spill-', dir=directory)
+        self.segment_size = segment_size
+        super().__init__(maxsize, metrics)
+        self.finalizer = weakref.finalize(
+            self, shutil.rmtree, self.directory, ignore_errors=True)
+
+    def _init(self, maxsize):
+        self.queue = SpillBuffer(self.high_water, self.directory,
+                                 self.segment_size, self.SENTINEL)
+
+    def stats(self):
+        with self.mutex:
+            return {'in_memory': len(self.queue.memory),
+                    'on_disk': self.queue.spilled,
+                    'segments': len(self.queue.segments)}
+
+    def dispose(self):
+        with self.mutex:
+            self.queue.dispose()
+        self.finalizer()
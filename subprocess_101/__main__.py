@@ -8,10 +8,17 @@ result = subprocess.run(
 result.check_returncode()
 print(result.stdout)
 
+from concurrent.futures import wait
+
+from subprocess_101.reaper import ChildSupervisor
+
+# The supervisor hears about the exit itself, so nothing spins while the
+# child runs.
+supervisor = ChildSupervisor()
 proc = subprocess.Popen(['sleep', '0.1'])
-while proc.poll() is None:
-    print('working .....')
-print('Exit statut', proc.poll())
+exited = supervisor.watch(proc)
+print('working .....')
+print('Exit statut', exited.result())
 
 # Decoupling child process from parent
 import time
@@ -22,12 +29,59 @@ for _ in range(100):
     proc = subprocess.Popen(['sleep', '1'])
     sleep_procs.append(proc)
 
-for proc in sleep_procs:
-    proc.communicate()
+wait([supervisor.watch(proc) for proc in sleep_procs])
 
 end = time.time()
 delta = end - start
 print(f'Finished in {delta:.3} seconds')
+if supervisor.use_pidfd:
+    print('    one pidfd per child, O(1) per exit')
+else:
+    print('    SIGCHLD: O(1) per exit unless an unwatched child is unreaped')
+
+import asyncio
+
+from subprocess_101.runner import Job, SubprocessRunner
+
+async def run_jobs(runner, jobs, timeout=None):
+    results = []
+    async for result in runner.run(jobs, timeout):
+        results.append(result)
+    return results
+
+def show_line(job, stream, line):
+    print(f'{job.name} {stream}: {line.decode().rstrip()}')
+
+jobs = [Job(['sh', '-c', 'echo one; sleep 0.2; echo two'], name='streamer'),
+        Job(['sleep', '5'], timeout=0.3, name='sleeper'),
+        Job(['sh', '-c', 'trap "" TERM; sleep 5'], timeout=0.3, name='stubborn')]
+runner = SubprocessRunner(limit=2, kill_after=0.2, on_output=show_line)
+for result in asyncio.run(run_jobs(runner, jobs, timeout=2)):
+    print(f'{result.job.name} exited {result.returncode} '
+          f'after {result.elapsed:.3f} seconds, timed out {result.timed_out}')
+
+# Throughput on short-lived children: everything at once with Popen
+# against the runner capped at a fixed number in flight.
+def popen_loop(count):
+    procs = [subprocess.Popen(['true']) for _ in range(count)]
+    for proc in procs:
+        proc.communicate()
+
+for count in (100, 1000):
+    start = time.time()
+    popen_loop(count)
+    end = time.time()
+    delta = end - start
+    print(f'{count} Popen children: {count / delta:.0f} per second')
+
+    for limit in (16, 64):
+        runner = SubprocessRunner(limit=limit, capture=False)
+        start = time.time()
+        asyncio.run(run_jobs(runner, [Job(['true']) for _ in range(count)]))
+        end = time.time()
+        delta = end - start
+        print(f'{count} runner children, {limit} at a time: '
+              f'{count / delta:.0f} per second')
 
 import os
 
@@ -54,7 +108,7 @@ for proc in procs:
     print(out)
 
 def run_hash(input_stdin):
-    return subprocess.Popen(['openssl', 'dgst', '-whirlpool', '-binary'],
+    return subprocess.Popen(['openssl', 'dgst', '-sha512', '-binary'],
                             stdin=input_stdin,
                             stdout=subprocess.PIPE)
 
@@ -89,3 +143,60 @@ except subprocess.TimeoutExpired:
     proc.wait()
 
 print('Wait status', proc.poll())
+
+# Streaming the same chain: payloads far bigger than a pipe buffer, read
+# from a file or generated on the fly, with memory bounded by one chunk.
+import resource
+import tempfile
+
+from subprocess_101.chain import Chain, encrypt_command, hash_command
+
+env = os.environ.copy()
+env['password'] = 'toto'
+chain = Chain([encrypt_command(), hash_command('sha256')], env=env)
+
+with tempfile.TemporaryFile() as payload:
+    for _ in range(64):
+        payload.write(os.urandom(1 << 20))
+    payload.seek(0)
+
+    start = time.time()
+    digest = chain.run(payload)
+    end = time.time()
+    delta = end - start
+    print(f'64 MiB file hashed in {delta:.3f} seconds: {digest.hex()}')
+
+start = time.time()
+digest = chain.run(os.urandom(1 << 20) for _ in range(64))
+end = time.time()
+delta = end - start
+print(f'64 MiB stream hashed in {delta:.3f} seconds: {digest.hex()}')
+
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(f'Peak memory {max_rss / 1024:.1f} MiB')
+
+# Small items at a high rate: one openssl pair spawned per item against
+# long-lived helpers that keep serving framed requests.
+from subprocess_101.coprocess import CoprocessPool
+from subprocess_101.helper import ENCRYPT, HASH
+
+items = [os.urandom(100) for _ in range(200)]
+
+start = time.time()
+for data in items:
+    encrypted, _ = run_encrypt(data).communicate()
+    hash_proc = subprocess.Popen(['openssl', 'dgst', '-sha512', '-binary'],
+                                 stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE)
+    hash_proc.communicate(encrypted)
+end = time.time()
+delta = end - start
+print(f'Spawn per item: {len(items) / delta:.0f} items per second')
+
+with CoprocessPool(4, env=env) as pool:
+    start = time.time()
+    encrypted = list(pool.map(ENCRYPT, items))
+    digests = list(pool.map(HASH, encrypted))
+    end = time.time()
+delta = end - start
+print(f'Co-process pool: {len(items) / delta:.0f} items per second')
@@ -0,0 +1,127 @@
+import io
+import os
+import socket
+import subprocess
+from threading import Thread
+
+
+CHUNK_SIZE = 64 << 10
+
+def encrypt_command(password_var='password'):
+    return ['openssl', 'enc', '-pbkdf2', '-pass', f'env:{password_var}']
+
+def hash_command(digest='sha256'):
+    return ['openssl', 'dgst', f'-{digest}', '-binary']
+
+def chunks_of(source, chunk_size):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif hasattr(source, 'read'):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
+
+# Runs commands as a pipeline: each child's stdout is the next one's stdin,
+# so stage to stage the data never passes through Python. A feeder thread
+# writes the source into the first stage one chunk at a time while the
+# caller drains the last stage, so memory stays at a chunk or two whatever
+# the input size. Sources backed by a file descriptor are spliced into the
+# pipe by the kernel when os.splice is available.
+class Chain:
+    def __init__(self, commands, env=None, chunk_size=CHUNK_SIZE):
+        self.commands = commands
+        self.env = env
+        self.chunk_size = chunk_size
+
+    def start(self):
+        procs = []
+        stdin = subprocess.PIPE
+        for command in self.commands:
+            proc = subprocess.Popen(command, env=self.env, stdin=stdin,
+                                    stdout=subprocess.PIPE)
+            if procs:
+                # Only the child needs the read end now.
+                procs[-1].stdout.close()
+                procs[-1].stdout = None
+            stdin = proc.stdout
+            procs.append(proc)
+        return procs
+
+    def splice_offset(self, source):
+        if not hasattr(os, 'splice') or not hasattr(source, 'fileno'):
+            return False, None
+        try:
+            source.fileno()
+        except (OSError, ValueError):
+            return False, None
+        try:
+            # The logical position, which counts what a buffered reader has
+            # already read ahead of the descriptor.
+            return True, source.tell()
+        except (AttributeError, OSError):
+            pass
+        # Unseekable: only safe when nothing can be sitting in a buffer.
+        return isinstance(source, (io.RawIOBase, socket.socket)), None
+
+    def splice(self, source, pipe, offset):
+        while True:
+            sent = os.splice(source.fileno(), pipe.fileno(), self.chunk_size,
+                             offset_src=offset)
+            if not sent:
+                break
+            if offset is not None:
+                offset += sent
+        if offset is not None:
+            source.seek(offset)
+
+    def feed(self, source, pipe, errors):
+        try:
+            spliceable, offset = self.splice_offset(source)
+            if spliceable:
+                pipe.flush()
+                self.splice(source, pipe, offset)
+                return
+            for chunk in chunks_of(source, self.chunk_size):
+                pipe.write(chunk)
+        except BrokenPipeError:
+            pass    # The first stage died; its exit status reports why
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+    def run(self, source, sink=None):
+        procs = self.start()
+        errors = []
+        feeder = Thread(target=self.feed, args=(source, procs[0].stdin, errors))
+        feeder.start()
+        procs[0].stdin = None
+
+        output = procs[-1].stdout
+        collected = bytearray()
+        try:
+            while chunk := output.read(self.chunk_size):
+                if sink is None:
+                    collected += chunk
+                else:
+                    sink.write(chunk)
+        finally:
+            output.close()
+            procs[-1].stdout = None
+            feeder.join()
+            for proc in procs:
+                proc.wait()
+
+        if errors:
+            # The children only saw a truncated input.
+            raise errors[0]
+        for command, proc in zip(self.commands, procs):
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, command)
+        return None if sink is not None else bytes(collected)
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from queue import Empty, Queue
+import selectors
+import subprocess
+import sys
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from subprocess_101.helper import ENCRYPT, FRAME, HASH, OK, PING
+
+
+HELPER_COMMAND = [sys.executable, '-m', 'subprocess_101.helper']
+
+class HelperDied(Exception):
+    pass
+
+class HelperTimeout(HelperDied):
+    pass
+
+class HelperError(Exception):
+    pass
+
+# Talks to the helper over non-blocking pipes so that every request,
+# writing it as well as reading the reply, can run against one deadline.
+class Helper:
+    def __init__(self, command, env=None, cwd=None):
+        self.proc = subprocess.Popen(command, env=env, cwd=cwd, bufsize=0,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+        os.set_blocking(self.proc.stdin.fileno(), False)
+        os.set_blocking(self.proc.stdout.fileno(), False)
+        self.served = 0
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def wait(self, fileobj, events, deadline):
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                raise HelperTimeout(f'helper {self.proc.pid} timed out')
+        with selectors.DefaultSelector() as selector:
+            selector.register(fileobj, events)
+            if not selector.select(timeout):
+                raise HelperTimeout(f'helper {self.proc.pid} timed out')
+
+    def send(self, data, deadline):
+        view = memoryview(data)
+        while view:
+            try:
+                sent = os.write(self.proc.stdin.fileno(), view)
+            except BlockingIOError:
+                self.wait(self.proc.stdin, selectors.EVENT_WRITE, deadline)
+                continue
+            view = view[sent:]
+
+    def receive(self, size, deadline):
+        data = bytearray()
+        while len(data) < size:
+            try:
+                chunk = os.read(self.proc.stdout.fileno(), size - len(data))
+            except BlockingIOError:
+                self.wait(self.proc.stdout, selectors.EVENT_READ, deadline)
+                continue
+            if not chunk:
+                raise EOFError('stream closed')
+            data += chunk
+        return bytes(data)
+
+    def request(self, op, payload, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        try:
+            self.send(FRAME.pack(op, len(payload)), deadline)
+            self.send(payload, deadline)
+            status, length = FRAME.unpack(self.receive(FRAME.size, deadline))
+            reply = self.receive(length, deadline)
+        except (BrokenPipeError, EOFError) as error:
+            raise HelperDied(f'helper {self.proc.pid} exited') from error
+        self.served += 1
+        if status != OK:
+            raise HelperError(reply.decode())
+        return reply
+
+    def close(self, timeout):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+# Long-lived helpers, each serving one framed request at a time. Callers
+# take an idle helper from the queue and put it back when done; a helper
+# that dies mid-request is replaced and the request retried once on the
+# new one. One that overruns request_timeout is replaced too, but the
+# request fails with HelperTimeout rather than risk hanging another helper.
+# A checker thread pings idle helpers and replaces any that are gone or
+# stuck.
+class CoprocessPool:
+    def __init__(self, size=None, command=HELPER_COMMAND, env=None,
+                 check_interval=5.0, check_timeout=1.0, close_timeout=5.0,
+                 request_timeout=None):
+        self.size = size or os.cpu_count() or 1
+        self.command = command
+        self.env = env
+        # The helper is imported as subprocess_101.helper, so run it from
+        # the directory that holds the package.
+        self.cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.check_timeout = check_timeout
+        self.close_timeout = close_timeout
+        self.request_timeout = request_timeout
+        self.idle = Queue()
+        self.lock = Lock()
+        self.restarts = 0
+        self.closed = False
+        for _ in range(self.size):
+            self.idle.put(self.spawn())
+        self.executor = ThreadPoolExecutor(self.size)
+        self.stopped = Event()
+        self.checker = Thread(target=self.check, args=(check_interval,),
+                              daemon=True)
+        self.checker.start()
+
+    def spawn(self):
+        return Helper(self.command, self.env, self.cwd)
+
+    def replace(self, helper):
+        helper.close(0)
+        with self.lock:
+            self.restarts += 1
+        return self.spawn()
+
+    def check_open(self):
+        if self.closed:
+            raise RuntimeError('cannot call after shutdown')
+
+    def call(self, op, payload):
+        self.check_open()
+        return self.run_call(op, payload)
+
+    def run_call(self, op, payload):
+        # No closed check here: calls queued before shutdown() still drain.
+        helper = self.idle.get()
+        try:
+            for retry in (False, True):
+                try:
+                    return helper.request(op, payload, self.request_timeout)
+                except HelperDied as error:
+                    helper = self.replace(helper)
+                    if retry or isinstance(error, HelperTimeout):
+                        raise
+        finally:
+            self.idle.put(helper)
+
+    def submit(self, op, payload):
+        self.check_open()
+        return self.executor.submit(self.run_call, op, payload)
+
+    def map(self, op, payloads):
+        self.check_open()
+        return self.executor.map(lambda payload: self.run_call(op, payload),
+                                 payloads)
+
+    def encrypt(self, data):
+        return self.call(ENCRYPT, data)
+
+    def hash(self, data):
+        return self.call(HASH, data)
+
+    def check_once(self):
+        checked = []
+        try:
+            for _ in range(self.size):
+                helper = self.idle.get_nowait()
+                try:
+                    if not helper.alive():
+                        raise HelperDied('exited')
+                    helper.request(PING, b'ping', self.check_timeout)
+                except HelperDied:
+                    helper = self.replace(helper)
+                checked.append(helper)
+        except Empty:
+            pass
+        finally:
+            for helper in checked:
+                self.idle.put(helper)
+
+    def check(self, interval):
+        while not self.stopped.wait(interval):
+            self.check_once()
+
+    def stats(self):
+        return {'helpers': self.size, 'restarts': self.restarts}
+
+    def shutdown(self, wait=True):
+        # Drain: refuse new calls, let queued and running ones finish, then
+        # close each helper's stdin so it exits at the end of its loop.
+        self.closed = True
+        self.stopped.set()
+        self.checker.join()
+        self.executor.shutdown(wait)
+        for _ in range(self.size):
+            self.idle.get().close(self.close_timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
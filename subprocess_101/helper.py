@@ -0,0 +1,71 @@
+import hashlib
+import os
+import struct
+import sys
+
+
+# Frames are a one-byte opcode (or status, in replies) and a four-byte
+# big-endian length, then that many bytes of payload.
+FRAME = struct.Struct('>BI')
+
+ENCRYPT = 1
+HASH = 2
+PING = 3
+
+OK = 0
+ERROR = 1
+
+ITERATIONS = 10_000    # Same as openssl enc -pbkdf2
+
+def read_exactly(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError('stream closed mid-frame' if data else 'stream closed')
+        data += chunk
+    return bytes(data)
+
+def write_frame(stream, code, payload):
+    stream.write(FRAME.pack(code, len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+def read_frame(stream):
+    code, length = FRAME.unpack(read_exactly(stream, FRAME.size))
+    return code, read_exactly(stream, length)
+
+def encrypt(data, password):
+    salt = os.urandom(16)
+    key = hashlib.pbkdf2_hmac('sha256', password, salt, ITERATIONS)
+    keystream = hashlib.shake_256(key).digest(len(data))
+    cipher = (int.from_bytes(data, 'big')
+              ^ int.from_bytes(keystream, 'big')).to_bytes(len(data), 'big')
+    return b'Salted__' + salt + cipher
+
+def digest(data):
+    return hashlib.sha512(data).digest()
+
+def serve(stdin, stdout, password):
+    while True:
+        try:
+            op, payload = read_frame(stdin)
+        except EOFError:
+            return
+        try:
+            if op == ENCRYPT:
+                result = encrypt(payload, password)
+            elif op == HASH:
+                result = digest(payload)
+            elif op == PING:
+                result = payload
+            else:
+                raise ValueError(f'unknown opcode {op}')
+        except Exception as error:
+            write_frame(stdout, ERROR, repr(error).encode())
+        else:
+            write_frame(stdout, OK, result)
+
+if __name__ == '__main__':
+    serve(sys.stdin.buffer, sys.stdout.buffer,
+          os.environ.get('password', '').encode())
@@ -0,0 +1,163 @@
+import asyncio
+from concurrent.futures import Future
+import os
+import signal
+from threading import Lock, Thread
+
+from threads_for_blocking_IO.reactor import Reactor
+
+
+def has_pidfd():
+    if not hasattr(os, 'pidfd_open'):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return False    # Kernel older than 5.3
+    return True
+
+class Child:
+    def __init__(self, pid, proc, future, callback):
+        self.pid = pid
+        self.proc = proc
+        self.future = future
+        self.callback = callback
+
+# Learns about child exits without polling. With pidfds each child gets a
+# descriptor that becomes readable when it exits, all waited on by one
+# reactor thread. Elsewhere a SIGCHLD handler wakes a reaper thread that
+# peeks at the next exited child with waitid(WNOWAIT) and reaps it only if
+# it is watched, which is O(1) per exit. Children nobody watches are left
+# for Popen or asyncio to reap; while one of them sits unreaped it hides
+# the rest, so wakes fall back to a waitpid(WNOHANG) over every watched
+# child, O(watched) per wake. A watched child stays a zombie until
+# collected here, so its pid cannot be reused early. The SIGCHLD handler
+# must be installed from the main thread.
+class ChildSupervisor:
+    def __init__(self, use_pidfd=None):
+        self.use_pidfd = has_pidfd() if use_pidfd is None else use_pidfd
+        self.lock = Lock()
+        self.children = {}
+        if self.use_pidfd:
+            self.reactor = Reactor()
+            self.reactor.start()
+        else:
+            self.wake_read, self.wake_write = os.pipe()
+            os.set_blocking(self.wake_write, False)
+            self.previous_handler = signal.signal(signal.SIGCHLD,
+                                                  self.on_sigchld)
+            self.reaper = Thread(target=self.reap_loop, daemon=True)
+            self.reaper.start()
+
+    def watch(self, child, callback=None):
+        if isinstance(child, int):
+            pid, proc = child, None
+        else:
+            pid, proc = child.pid, child
+        future = Future()
+        watched = Child(pid, proc, future, callback)
+
+        if proc is not None and proc.returncode is not None:
+            self.finish(watched, proc.returncode)
+            return future
+        if self.use_pidfd:
+            try:
+                pidfd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                # Already reaped by someone else: only a Popen knows how.
+                self.finish(watched, proc.poll() if proc else None)
+                return future
+            self.reactor.add_reader(
+                pidfd, lambda pidfd, mask: self.on_pidfd(pidfd, watched))
+        else:
+            with self.lock:
+                self.children[pid] = watched
+                # It may have exited before it was registered.
+                collected = self.collect(pid)
+            if collected is not None:
+                self.finish(*collected)
+        return future
+
+    async def wait(self, child):
+        return await asyncio.wrap_future(self.watch(child))
+
+    def finish(self, watched, returncode):
+        if watched.proc is not None:
+            watched.proc.returncode = returncode
+        watched.future.set_result(returncode)
+        if watched.callback is not None:
+            watched.callback(watched.pid, returncode)
+
+    def on_pidfd(self, pidfd, watched):
+        # Runs on the reactor thread, so the selector can be changed here.
+        self.reactor.selector.unregister(pidfd)
+        os.close(pidfd)
+        try:
+            # The child is a zombie by now, so this never blocks.
+            _, status = os.waitpid(watched.pid, 0)
+        except ChildProcessError:
+            returncode = watched.proc.poll() if watched.proc else None
+        else:
+            returncode = os.waitstatus_to_exitcode(status)
+        self.finish(watched, returncode)
+
+    def on_sigchld(self, signum, frame):
+        try:
+            os.write(self.wake_write, b'\0')
+        except BlockingIOError:
+            pass    # A wake-up is already pending
+
+    def collect(self, pid):
+        # Called with the lock held, so watch() and the reaper never both
+        # wait for the same pid.
+        watched = self.children[pid]
+        try:
+            reaped, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            # Reaped by someone else: only a Popen knows how.
+            returncode = watched.proc.poll() if watched.proc else None
+        else:
+            if not reaped:
+                return None
+            returncode = os.waitstatus_to_exitcode(status)
+        del self.children[pid]
+        return watched, returncode
+
+    def reap_ready(self):
+        collected = []
+        while self.children:
+            try:
+                exited = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG
+                                   | os.WNOWAIT)
+            except ChildProcessError:
+                exited = False  # No children left: all reaped elsewhere
+            if exited is None:
+                break   # Nothing else has exited
+            if exited and exited.si_pid in self.children:
+                collected.append(self.collect(exited.si_pid))
+                continue
+            # Someone else's child is first in line; check each of ours.
+            for pid in list(self.children):
+                result = self.collect(pid)
+                if result is not None:
+                    collected.append(result)
+            break
+        return collected
+
+    def reap_loop(self):
+        while True:
+            if not os.read(self.wake_read, 4096):
+                return
+            with self.lock:
+                collected = self.reap_ready()
+            for watched, returncode in collected:
+                self.finish(watched, returncode)
+
+    def close(self):
+        if self.use_pidfd:
+            self.reactor.stop()
+        else:
+            signal.signal(signal.SIGCHLD, self.previous_handler)
+            os.close(self.wake_write)
+            self.reaper.join()
+            os.close(self.wake_read)
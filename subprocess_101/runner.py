@@ -0,0 +1,159 @@
+import asyncio
+from collections import namedtuple
+import os
+import signal
+import subprocess
+
+
+class Job:
+    def __init__(self, args, input=None, timeout=None, name=None):
+        self.args = args
+        self.input = input
+        self.timeout = timeout
+        self.name = name or ' '.join(args)
+
+Result = namedtuple('Result', 'job returncode stdout stderr timed_out elapsed')
+
+# Each child leads its own process group, so anything it spawned is
+# signalled with it and cannot keep the pipes open afterwards.
+def signal_group(proc, signum):
+    try:
+        os.killpg(proc.pid, signum)
+    except ProcessLookupError:
+        pass
+
+async def stop(proc, kill_after):
+    if proc.returncode is None:
+        signal_group(proc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), kill_after)
+            return
+        except asyncio.TimeoutError:
+            pass
+    signal_group(proc, signal.SIGKILL)
+    await proc.wait()
+
+# Runs at most `limit` children at a time. Output is read line by line as it
+# arrives and handed to on_output(job, stream, line); it is also kept in the
+# Result unless capture is False. A job that overruns its own timeout or
+# the run's global one is sent SIGTERM, then SIGKILL after kill_after.
+class SubprocessRunner:
+    def __init__(self, limit=None, kill_after=1.0, on_output=None,
+                 capture=True, chunk_size=64 << 10, max_line=1 << 20):
+        self.limit = limit or 4 * (os.cpu_count() or 1)
+        self.kill_after = kill_after
+        self.on_output = on_output
+        self.capture = capture
+        self.chunk_size = chunk_size
+        self.max_line = max_line
+
+    def emit(self, job, name, line, chunks):
+        if self.capture:
+            chunks.append(line)
+        if self.on_output is not None:
+            self.on_output(job, name, line)
+
+    async def pump(self, job, name, stream, chunks):
+        # Reads fixed-size chunks and splits lines itself, so long lines and
+        # binary output cannot overrun the stream's line limit. A line longer
+        # than max_line is handed over in max_line pieces.
+        partial = b''
+        error = None
+        while True:
+            data = await stream.read(self.chunk_size)
+            if error is not None:
+                if not data:
+                    raise error
+                continue    # Keep draining so the child never blocks
+            try:
+                if not data:
+                    if partial:
+                        self.emit(job, name, partial, chunks)
+                    return
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                for line in lines:
+                    self.emit(job, name, line + b'\n', chunks)
+                while len(partial) >= self.max_line:
+                    self.emit(job, name, partial[:self.max_line], chunks)
+                    partial = partial[self.max_line:]
+            except Exception as e:
+                error = e
+
+    async def feed(self, stdin, data):
+        try:
+            stdin.write(data)
+            await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            stdin.close()
+
+    async def run_job(self, job, semaphore, deadline):
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            began = loop.time()
+            timeout = job.timeout
+            if deadline is not None:
+                left = deadline - began
+                if left <= 0:
+                    return Result(job, None, b'', b'', True, 0.0)
+                timeout = left if timeout is None else min(timeout, left)
+
+            spawn = asyncio.ensure_future(asyncio.create_subprocess_exec(
+                *job.args,
+                stdin=subprocess.DEVNULL if job.input is None else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True))
+            try:
+                proc = await asyncio.shield(spawn)
+            except asyncio.CancelledError:
+                # A spawn cancelled half way can wait forever for pipes that
+                # never connect, so let it finish and stop the child instead.
+                proc = await spawn
+                await stop(proc, self.kill_after)
+                raise
+            stdout = []
+            stderr = []
+            io = [self.pump(job, 'stdout', proc.stdout, stdout),
+                  self.pump(job, 'stderr', proc.stderr, stderr)]
+            if job.input is not None:
+                io.append(self.feed(proc.stdin, job.input))
+            io = asyncio.gather(*io)
+
+            timed_out = False
+            try:
+                await asyncio.wait_for(proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                await stop(proc, self.kill_after)
+            except asyncio.CancelledError:
+                io.cancel()
+                await stop(proc, self.kill_after)
+                await asyncio.gather(io, return_exceptions=True)
+                raise
+            try:
+                # A grandchild may still hold the pipes open.
+                await asyncio.wait_for(io, self.kill_after)
+            except asyncio.TimeoutError:
+                pass
+            return Result(job, proc.returncode, b''.join(stdout),
+                          b''.join(stderr), timed_out, loop.time() - began)
+
+    async def run(self, jobs, timeout=None):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        semaphore = asyncio.Semaphore(self.limit)
+        pending = {asyncio.create_task(self.run_job(job, semaphore, deadline))
+                   for job in jobs}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
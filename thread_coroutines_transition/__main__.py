@@ -1,5 +1,6 @@
-class NoNewData(Exception):
-    pass
+from thread_coroutines_transition.line_reader import (ChunkedLineReader,
+                                                      MmapLineReader,
+                                                      NoNewData)
 
 def readline(handle):
     offset = handle.tell()
@@ -12,42 +13,163 @@ def readline(handle):
     handle.seek(offset, 0)
     return handle.readline()
 
+import os
+import random
+import shutil
+import tempfile
+from threading import Lock, Thread
 import time
 
-def tail_file(handle, interval, write_func):
-    while not handle.closed:
+from thread_coroutines_transition.merge import TimestampMerger
+from thread_coroutines_transition.tailer import Tailer
+from thread_coroutines_transition.verify import verify_merge
+from thread_coroutines_transition.watcher import Watcher
+
+# Catching up on a large backlog: the seek/tell readline above against the
+# chunked and mmap readers. LINE_BENCH_MB sets the log size (try a few GB).
+def write_log(path, size):
+    line = b'%.6f input0.log %d\n'
+    with open(path, 'wb') as handle:
+        index = 0
+        while handle.tell() < size:
+            handle.write(b''.join(line % (time.time(), index + offset)
+                                  for offset in range(10_000)))
+            index += 10_000
+
+def count_readline(handle):
+    count = 0
+    while True:
         try:
-            line = readline(handle)
+            readline(handle)
         except NoNewData:
-            time.sleep(interval)
-        else:
-            write_func(line)
+            return count
+        count += 1
 
-from threading import Lock, Thread
+def count_chunked(handle):
+    return sum(len(lines) for lines in ChunkedLineReader(handle).blocks())
+
+def count_mmap(handle):
+    reader = MmapLineReader(handle)
+    count = sum(1 for _ in reader.lines())
+    reader.close()
+    return count
+
+size = int(os.environ.get('LINE_BENCH_MB', '64')) << 20
+with tempfile.NamedTemporaryFile() as log:
+    write_log(log.name, size)
+    for count_lines in (count_readline, count_chunked, count_mmap):
+        with open(log.name, 'rb') as handle:
+            start = time.time()
+            count = count_lines(handle)
+            end = time.time()
+        delta = end - start
+        print(f'{count_lines.__name__}: {count / delta:,.0f} lines/second, '
+              f'{size / delta / (1 << 20):,.0f} MiB/second')
 
-def run_threads(handles, interval, output_path):
+def write_lines(path, count):
+    with open(path, 'ab', buffering=0) as handle:
+        for index in range(count):
+            line = f'{time.time():.6f} {os.path.basename(path)} {index}\n'
+            handle.write(line.encode())
+            time.sleep(random.random() * 0.01)
+
+def run_threads(handles, interval, output_path, producers, merger=None):
     with open(output_path, 'wb') as output:
         lock = Lock()
-        def write(data):
-            with lock:
-                output.write(data)
-                threads = []
-                for handle in handles:
-                    args = (handle, interval, write)
-                    thread = Thread(target=tail_file, args=args)
-                    thread.start()
-                    threads.append(thread)
-                
-                for thread in threads:
-                    thread.join()
-
-def confirm_merge(input_path, output_path):
-    # ....
-    pass
-
-input_paths = []
-handles = []
-output_path = []
-run_threads(handles, 0.1, output_path)
-
-confirm_merge(input_path, output_path)
+        def writer(source):
+            def write(data):
+                with lock:
+                    if merger is None:
+                        output.write(data)
+                    else:
+                        output.write(b''.join(merger.add(source, data)))
+            return write
+
+        tailers = [Tailer(handle, writer(index), interval)
+                   for index, handle in enumerate(handles)]
+        threads = []
+        for tailer in tailers:
+            thread = Thread(target=tailer.run)
+            thread.start()
+            threads.append(thread)
+
+        for producer in producers:
+            producer.join()
+        for tailer in tailers:
+            tailer.stop()
+        for thread in threads:
+            thread.join()
+
+        if merger is not None:
+            for index in range(len(handles)):
+                output.write(b''.join(merger.close(index)))
+            output.write(b''.join(merger.flush()))
+
+def run_watcher(handles, interval, output_path, producers, merger=None):
+    with open(output_path, 'wb') as output:
+        # One thread for every handle; it delivers blocks of whole lines.
+        def writer(source):
+            def write(data):
+                if merger is None:
+                    output.write(data)
+                    return
+                for line in data.splitlines(keepends=True):
+                    output.write(b''.join(merger.add(source, line)))
+            return write
+
+        watcher = Watcher(handles, [writer(index)
+                                    for index in range(len(handles))],
+                          interval=interval)
+        thread = Thread(target=watcher.run)
+        thread.start()
+
+        for producer in producers:
+            producer.join()
+        watcher.stop()
+        thread.join()
+
+        if merger is not None:
+            for index in range(len(handles)):
+                output.write(b''.join(merger.close(index)))
+            output.write(b''.join(merger.flush()))
+
+def confirm_merge(input_paths, output_path):
+    mismatches = verify_merge(input_paths, output_path)
+    for mismatch in mismatches:
+        print(f'{mismatch.kind} line at {mismatch.path}:{mismatch.offset} '
+              f'{mismatch.line!r}')
+    if not mismatches:
+        print(f'Merge of {len(input_paths)} files verified')
+
+def run_demo(run, count, lines, lateness=0.5):
+    directory = tempfile.mkdtemp()
+    input_paths = [os.path.join(directory, f'input{index}.log')
+                   for index in range(count)]
+    for path in input_paths:
+        open(path, 'wb').close()
+    handles = [open(path, 'rb') for path in input_paths]
+    output_path = os.path.join(directory, 'merged.log')
+
+    producers = [Thread(target=write_lines, args=(path, lines))
+                 for path in input_paths]
+    start = time.time()
+    for producer in producers:
+        producer.start()
+    merger = TimestampMerger(range(len(handles)), lateness=lateness)
+    run(handles, 0.1, output_path, producers, merger)
+    end = time.time()
+    delta = end - start
+    print(f'{run.__name__} over {count} files took {delta:.3f} seconds',
+          merger.stats())
+
+    confirm_merge(input_paths, output_path)
+
+    for handle in handles:
+        handle.close()
+    shutil.rmtree(directory)
+
+run_demo(run_threads, 5, 100)
+run_demo(run_watcher, 5, 100)
+# A thousand producer threads starve the reader of the GIL on a small box,
+# so allow lines to arrive further behind the newest one.
+run_demo(run_watcher, 1000, 100, lateness=5.0)
@@ -0,0 +1,103 @@
+import io
+import mmap
+import os
+
+
+class NoNewData(Exception):
+    pass
+
+# Reads from `position` onwards with pread in chunk_size blocks, so the
+# handle's own offset is never touched, and splits each block in C. A line
+# without its newline yet is held back until the rest of it arrives.
+class ChunkedLineReader:
+    def __init__(self, handle, chunk_size=1 << 20):
+        self.handle = handle
+        self.fd = handle.fileno()
+        self.position = handle.tell()
+        self.chunk_size = chunk_size
+        self.partial = b''
+        self.pending = []
+
+    def seek(self, position):
+        self.position = position
+        self.partial = b''
+        self.pending = []
+
+    def read_block(self):
+        chunk = os.pread(self.fd, self.chunk_size, self.position)
+        if not chunk:
+            return None
+        self.position += len(chunk)
+        if self.partial:
+            chunk = self.partial + chunk
+        lines = io.BytesIO(chunk).readlines()
+        if lines[-1].endswith(b'\n'):
+            self.partial = b''
+        else:
+            self.partial = lines.pop()
+        return lines
+
+    def blocks(self):
+        while (lines := self.read_block()) is not None:
+            if lines:
+                yield lines
+
+    def lines(self):
+        for lines in self.blocks():
+            yield from lines
+
+    def readline(self):
+        while not self.pending:
+            lines = self.read_block()
+            if lines is None:
+                raise NoNewData
+            self.pending = lines[::-1]
+        return self.pending.pop()
+
+# Maps the file and hands out memoryview slices of the mapping, one per
+# line, without copying. The views stay valid until the next call to
+# lines(), which may remap a file that has grown.
+class MmapLineReader:
+    def __init__(self, handle):
+        self.handle = handle
+        self.fd = handle.fileno()
+        self.position = handle.tell()
+        self.map = None
+        self.view = None
+
+    def seek(self, position):
+        self.position = position
+
+    def remap(self, size):
+        self.close()
+        self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+    def lines(self):
+        size = os.fstat(self.fd).st_size
+        if size <= self.position:
+            return
+        if self.map is None or len(self.map) < size:
+            self.remap(size)
+        find = self.map.find
+        start = self.position
+        while (end := find(b'\n', start, size)) >= 0:
+            end += 1
+            self.position = end
+            yield self.view[start:end]
+            start = end
+
+    def readline(self):
+        for line in self.lines():
+            return line
+        raise NoNewData
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass    # Lines still in use; the map goes when they do
+        self.map = self.view = None
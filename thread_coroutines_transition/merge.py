@@ -0,0 +1,88 @@
+from heapq import heapify, heappop, heappush
+from itertools import count
+
+
+def leading_float(line):
+    return float(line.split(None, 1)[0])
+
+# A k-way merge of line streams that are each already in timestamp order.
+# A line is released once every open source has reached its timestamp, so
+# the output is ordered; a source that goes quiet can hold lines back for
+# at most `lateness` (in timestamp units) behind the newest line seen, and
+# never more than max_buffered lines are held. A line older than one
+# already released is passed straight through and counted as late.
+class TimestampMerger:
+    def __init__(self, sources, timestamp=leading_float, lateness=1.0,
+                 max_buffered=100_000):
+        self.timestamp = timestamp
+        self.lateness = lateness
+        self.max_buffered = max_buffered
+        self.heap = []
+        self.sequence = count()
+        self.marks = {}
+        self.lows = []
+        for source in sources:
+            self.marks[source] = float('-inf')
+            heappush(self.lows, (float('-inf'), source))
+        self.newest = float('-inf')
+        self.released = float('-inf')
+        self.late = 0
+        self.unparsed = 0
+
+    def low_mark(self):
+        # Stale entries are left in the heap and skipped here.
+        lows = self.lows
+        while lows and lows[0][0] != self.marks[lows[0][1]]:
+            heappop(lows)
+        return lows[0][0] if lows else float('inf')
+
+    def advance(self, source, mark):
+        if mark > self.marks[source]:
+            self.marks[source] = mark
+            heappush(self.lows, (mark, source))
+            if len(self.lows) > 2 * len(self.marks):
+                # A quiet source pins its entry on top, so stale ones
+                # below it are never popped; start over from the marks.
+                self.lows = [(low, name) for name, low in self.marks.items()]
+                heapify(self.lows)
+
+    def add(self, source, line):
+        try:
+            stamp = self.timestamp(line)
+        except (ValueError, IndexError):
+            # No timestamp: keep it next to the line before it.
+            self.unparsed += 1
+            stamp = max(self.marks[source], self.released)
+        if stamp < self.released:
+            self.late += 1
+            return [line]
+        heappush(self.heap, (stamp, next(self.sequence), line))
+        self.advance(source, stamp)
+        if stamp > self.newest:
+            self.newest = stamp
+        return self.ready()
+
+    def ready(self):
+        limit = max(self.low_mark(), self.newest - self.lateness)
+        heap = self.heap
+        lines = []
+        while heap and (heap[0][0] <= limit or len(heap) > self.max_buffered):
+            stamp, _, line = heappop(heap)
+            self.released = stamp
+            lines.append(line)
+        return lines
+
+    def close(self, source):
+        self.advance(source, float('inf'))
+        return self.ready()
+
+    def flush(self):
+        lines = [line for _, _, line in sorted(self.heap)]
+        if self.heap:
+            self.released = max(self.released, max(self.heap)[0])
+        self.heap = []
+        return lines
+
+    def stats(self):
+        return {'buffered': len(self.heap), 'late': self.late,
+                'unparsed': self.unparsed}
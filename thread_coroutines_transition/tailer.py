@@ -0,0 +1,192 @@
+import ctypes
+import ctypes.util
+import os
+import selectors
+import struct
+from threading import Lock
+
+from thread_coroutines_transition.line_reader import ChunkedLineReader
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT = struct.Struct('iIII')
+
+libc = None
+
+def load_libc():
+    global libc
+    if libc is None:
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True) if name else False
+    return libc
+
+def has_inotify():
+    lib = load_libc()
+    return bool(lib) and hasattr(lib, 'inotify_init1')
+
+class Inotify:
+    def __init__(self):
+        lib = load_libc()
+        self.fd = lib.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def add_watch(self, path, mask):
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def remove_watch(self, wd):
+        libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+# Follows a file opened in binary mode and hands each complete line to
+# write_func, starting from the handle's current offset. On Linux it sleeps
+# on inotify until the file (or its directory, to catch rotation) changes;
+# elsewhere it stat-polls, backing off from min_interval up to interval
+# while the file is idle. A file that shrinks is read again from the start;
+# one that is replaced by a new file at the same path is drained and then
+# followed at the new inode.
+class Tailer:
+    def __init__(self, handle, write_func, interval=0.1, min_interval=0.001,
+                 use_inotify=None):
+        self.handle = handle
+        self.path = os.path.abspath(handle.name)
+        self.write_func = write_func
+        self.interval = interval
+        self.min_interval = min_interval
+        self.use_inotify = has_inotify() if use_inotify is None else use_inotify
+        self.reader = ChunkedLineReader(handle)
+        self.wake_read, self.wake_write = os.pipe()
+        self.lock = Lock()
+        self.stopping = False
+        self.finished = False
+
+    def read_lines(self):
+        got = False
+        for lines in self.reader.blocks():
+            got = True
+            for line in lines:
+                self.write_func(line)
+        return got
+
+    def rotated(self):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False    # Mid-rotation: wait for the new file
+        opened = os.fstat(self.handle.fileno())
+        if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            return True
+        if current.st_size < self.reader.position:
+            # Truncated in place: whatever was pending is gone too.
+            self.reader.seek(0)
+        return False
+
+    def reopen(self):
+        self.read_lines()
+        if self.reader.partial:
+            self.write_func(self.reader.partial)
+        self.handle.close()
+        self.handle = open(self.path, 'rb')
+        self.reader = ChunkedLineReader(self.handle)
+
+    def check(self):
+        got = self.read_lines()
+        if self.rotated():
+            self.reopen()
+            got = self.read_lines() or True
+        return got
+
+    def watch(self, inotify):
+        return inotify.add_watch(self.path, IN_MODIFY | IN_ATTRIB |
+                                 IN_MOVE_SELF | IN_DELETE_SELF)
+
+    def run_inotify(self):
+        inotify = Inotify()
+        selector = selectors.DefaultSelector()
+        try:
+            inotify.add_watch(os.path.dirname(self.path),
+                              IN_CREATE | IN_MOVED_TO)
+            file_wd = self.watch(inotify)
+            selector.register(inotify.fd, selectors.EVENT_READ)
+            selector.register(self.wake_read, selectors.EVENT_READ)
+            while not self.stopping and not self.handle.closed:
+                handle = self.handle
+                self.check()
+                if self.handle is not handle:
+                    inotify.remove_watch(file_wd)
+                    file_wd = self.watch(inotify)
+                    continue
+                selector.select()
+                # Events only wake us up; check() works out what changed.
+                inotify.read()
+        finally:
+            selector.close()
+            inotify.close()
+
+    def run_polling(self):
+        delay = self.min_interval
+        while not self.stopping and not self.handle.closed:
+            if self.check():
+                delay = self.min_interval
+                continue
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.wake_read, selectors.EVENT_READ)
+                selector.select(delay)
+            delay = min(delay * 2, self.interval)
+
+    def run(self):
+        try:
+            if self.use_inotify:
+                self.run_inotify()
+            else:
+                self.run_polling()
+            if not self.handle.closed:
+                # Deliver whatever was written before stop() was called.
+                self.check()
+        except ValueError:
+            if not self.handle.closed:
+                raise    # Otherwise closed under us, which means stop
+        finally:
+            with self.lock:
+                self.finished = True
+                os.close(self.wake_read)
+                os.close(self.wake_write)
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            if not self.finished:
+                os.write(self.wake_write, b'\0')
+
+def tail_file(handle, interval, write_func):
+    Tailer(handle, write_func, interval).run()
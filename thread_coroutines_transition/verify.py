@@ -0,0 +1,151 @@
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+
+from thread_coroutines_transition.line_reader import ChunkedLineReader
+
+
+Mismatch = namedtuple('Mismatch', 'kind path offset line')
+
+def line_hash(line):
+    return int.from_bytes(blake2b(line, digest_size=8).digest(), 'little')
+
+def hash_lines(path, chunk_size=1 << 20):
+    # Eight bytes per line, whatever the line length.
+    hashes = array('Q')
+    with open(path, 'rb') as handle:
+        reader = ChunkedLineReader(handle, chunk_size)
+        for lines in reader.blocks():
+            hashes.extend(map(line_hash, lines))
+        if reader.partial:
+            hashes.append(line_hash(reader.partial))
+    return hashes
+
+def locate(path, indices):
+    # Only called for mismatches, so a second pass is cheap enough.
+    wanted = set(indices)
+    found = {}
+    offset = 0
+    with open(path, 'rb') as handle:
+        for index, line in enumerate(handle):
+            if index in wanted:
+                found[index] = offset, line
+                if len(found) == len(wanted):
+                    break
+            offset += len(line)
+    return found
+
+# Checks that each input's lines appear in the merged output, in their
+# original order and each exactly once, and that the output has nothing
+# else. Inputs and output are hashed in parallel processes, one chunked
+# pass each, and the hashes come back to this process: memory is 8 bytes
+# per line of input plus 8 per line of output, whatever the line lengths.
+# The check then walks the output once, matching each line to an input
+# whose next expected line has the same hash. When several inputs expect
+# the same line (blank lines, repeated messages) and go on differently
+# within `lookahead` lines, the one whose following lines show up first in
+# the output gets it. A line nobody expects is searched for in the next
+# `window` lines of every input, so one dropped line is reported once
+# instead of derailing the rest of its input.
+def verify_merge(input_paths, output_path, max_workers=None, window=1 << 16,
+                 lookahead=16, max_reports=10):
+    with ProcessPoolExecutor(max_workers) as pool:
+        output_future = pool.submit(hash_lines, output_path)
+        inputs = list(pool.map(hash_lines, input_paths))
+        output = output_future.result()
+
+    positions = [0] * len(inputs)
+    expecting = {}
+    skipped = {}
+    problems = []
+
+    def expect(source):
+        if positions[source] < len(inputs[source]):
+            expecting.setdefault(inputs[source][positions[source]],
+                                 []).append(source)
+
+    def unexpect(source):
+        value = inputs[source][positions[source]]
+        sources = expecting[value]
+        sources.remove(source)
+        if not sources:
+            del expecting[value]
+
+    def resync(value):
+        for source, hashes in enumerate(inputs):
+            start = positions[source]
+            try:
+                found = hashes.index(value, start, start + window)
+            except ValueError:
+                continue
+            unexpect(source)
+            for index in range(start, found):
+                skipped.setdefault(hashes[index], []).append((source, index))
+            positions[source] = found + 1
+            expect(source)
+            return True
+        return False
+
+    def choose(sources, index):
+        # Inputs that carry on identically for the next `lookahead` lines
+        # are interchangeable here, so a run of repeated lines costs one
+        # array comparison per line and no output scan.
+        runs = [inputs[source][positions[source] + 1:
+                               positions[source] + 1 + lookahead]
+                for source in sources]
+        if all(run == runs[0] for run in runs[1:]):
+            return sources[0]
+        following = {source: positions[source] + 1 for source in sources}
+        end = min(len(output), index + 1 + lookahead)
+        for position in range(index + 1, end):
+            value = output[position]
+            matching = [source for source in sources
+                        if following[source] < len(inputs[source])
+                        and inputs[source][following[source]] == value]
+            if len(matching) == len(sources):
+                # Still identical so far; compare the next lines.
+                for source in sources:
+                    following[source] += 1
+            elif matching:
+                return matching[0]
+        return sources[0]
+
+    for source in range(len(inputs)):
+        expect(source)
+
+    for index, value in enumerate(output):
+        sources = expecting.get(value)
+        if sources:
+            source = sources[0] if len(sources) == 1 else choose(sources, index)
+            sources.remove(source)
+            if not sources:
+                del expecting[value]
+            positions[source] += 1
+            expect(source)
+        elif value in skipped:
+            source, line = skipped[value].pop(0)
+            if not skipped[value]:
+                del skipped[value]
+            problems.append(('out of order', source, line))
+        elif not resync(value):
+            problems.append(('unexpected', None, index))
+
+    for entries in skipped.values():
+        problems.extend(('missing', source, line) for source, line in entries)
+    for source, hashes in enumerate(inputs):
+        if positions[source] < len(hashes):
+            problems.append(('missing', source, positions[source]))
+
+    problems = problems[:max_reports]
+    paths = [output_path if source is None else input_paths[source]
+             for _, source, _ in problems]
+    wanted = {}
+    for path, (_, _, line) in zip(paths, problems):
+        wanted.setdefault(path, []).append(line)
+    located = {path: locate(path, lines) for path, lines in wanted.items()}
+    mismatches = []
+    for path, (kind, _, line) in zip(paths, problems):
+        offset, text = located[path].get(line, (None, b''))
+        mismatches.append(Mismatch(kind, path, offset, text))
+    return mismatches
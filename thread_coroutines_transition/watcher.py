@@ -0,0 +1,238 @@
+import asyncio
+from collections import deque
+import os
+import selectors
+from threading import Lock
+
+from thread_coroutines_transition.line_reader import ChunkedLineReader
+from thread_coroutines_transition.tailer import (IN_ATTRIB, IN_CREATE,
+                                                 IN_DELETE_SELF, IN_MODIFY,
+                                                 IN_MOVE_SELF, IN_MOVED_TO,
+                                                 IN_Q_OVERFLOW, Inotify,
+                                                 has_inotify)
+
+
+FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+DIRECTORY_EVENTS = IN_CREATE | IN_MOVED_TO
+
+class WatchedFile:
+    def __init__(self, handle, sink, chunk_size):
+        self.handle = handle
+        self.path = os.path.abspath(handle.name)
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.reader = ChunkedLineReader(handle, chunk_size)
+        self.wd = None
+        self.queued = False
+
+    def read_block(self):
+        if os.fstat(self.handle.fileno()).st_size < self.reader.position:
+            self.reader.seek(0)     # Truncated in place
+        lines = self.reader.read_block()
+        # Anything read at all means there may be more behind it.
+        return b''.join(lines) if lines else None, lines is not None
+
+    def reopen(self):
+        self.handle.close()
+        self.handle = open(self.path, 'rb')
+        self.reader = ChunkedLineReader(self.handle, self.chunk_size)
+
+# One watcher for any number of files: a single inotify descriptor says
+# which files changed, and only those are read. Each turn reads at most one
+# chunk_size block per changed file, round-robin, so a busy file cannot
+# starve the rest. Blocks of complete lines go to that file's sink, either
+# a plain function (run) or a coroutine function such as WriteThread.write
+# (run_async). Without inotify every file is stat-polled on one timer.
+class Watcher:
+    def __init__(self, handles, write_func, chunk_size=64 << 10,
+                 interval=0.1, use_inotify=None):
+        if callable(write_func):
+            write_func = [write_func] * len(handles)
+        self.files = [WatchedFile(handle, sink, chunk_size)
+                      for handle, sink in zip(handles, write_func)]
+        self.interval = interval
+        self.use_inotify = has_inotify() if use_inotify is None else use_inotify
+        self.ready = deque()
+        self.by_wd = {}
+        self.by_name = {}
+        self.inotify = None
+        self.lock = Lock()
+        self.wake_read, self.wake_write = os.pipe()
+        self.stopping = False
+        self.finished = False
+
+    def queue(self, watched):
+        if not watched.queued:
+            watched.queued = True
+            self.ready.append(watched)
+
+    def watch_file(self, watched):
+        if watched.wd is not None:
+            # The old file may live on as a rotated copy; stop watching it.
+            self.by_wd.pop(watched.wd, None)
+            self.inotify.remove_watch(watched.wd)
+        watched.wd = self.inotify.add_watch(watched.path, FILE_EVENTS)
+        self.by_wd[watched.wd] = watched
+
+    def open_inotify(self):
+        self.inotify = Inotify()
+        directories = {}
+        for watched in self.files:
+            directory, name = os.path.split(watched.path)
+            if directory not in directories:
+                directories[directory] = self.inotify.add_watch(
+                    directory, DIRECTORY_EVENTS)
+            self.by_name[directories[directory], os.fsencode(name)] = watched
+            self.watch_file(watched)
+            self.queue(watched)     # Catch up on anything already there
+
+    def handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so any file may have changed or rotated.
+                yield from self.poll()
+                continue
+            watched = self.by_wd.get(wd)
+            if watched is not None:
+                self.queue(watched)
+                continue
+            watched = self.by_name.get((wd, name))
+            if watched is not None:
+                yield from self.rotate(watched)
+
+    def rotate(self, watched):
+        # Finish the old file, then follow the new one at the same path.
+        yield from self.drain(watched)
+        if watched.reader.partial:
+            yield watched, watched.reader.partial
+        watched.reopen()
+        if self.inotify is not None:
+            self.watch_file(watched)
+        self.queue(watched)
+
+    def drain(self, watched):
+        more = True
+        while more:
+            data, more = watched.read_block()
+            if data:
+                yield watched, data
+
+    def poll(self):
+        for watched in self.files:
+            try:
+                current = os.stat(watched.path)
+            except FileNotFoundError:
+                continue    # Mid-rotation: wait for the new file
+            opened = os.fstat(watched.handle.fileno())
+            if (current.st_dev, current.st_ino) != (opened.st_dev,
+                                                    opened.st_ino):
+                yield from self.rotate(watched)
+            elif current.st_size != watched.reader.position:
+                self.queue(watched)
+
+    def turn(self):
+        # One fair pass over the files that were ready at its start.
+        for _ in range(len(self.ready)):
+            watched = self.ready.popleft()
+            watched.queued = False
+            data, more = watched.read_block()
+            if data:
+                yield watched, data
+            if more:
+                self.queue(watched)
+
+    def finish(self):
+        for watched in self.files:
+            yield from self.drain(watched)
+
+    def wait(self, selector, delay):
+        for key, _ in selector.select(delay):
+            if key.fileobj == self.wake_read:
+                os.read(self.wake_read, 4096)
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.wake_read, selectors.EVENT_READ)
+        try:
+            if self.use_inotify:
+                self.open_inotify()
+                selector.register(self.inotify.fd, selectors.EVENT_READ)
+            while not self.stopping:
+                if self.use_inotify:
+                    changes = self.handle_events(self.inotify.read())
+                else:
+                    # Stat every file only between busy stretches.
+                    changes = () if self.ready else self.poll()
+                for watched, data in changes:
+                    watched.sink(data)
+                for watched, data in self.turn():
+                    watched.sink(data)
+                if self.ready:
+                    continue
+                self.wait(selector, None if self.use_inotify else self.interval)
+            # Deliver whatever was written before stop() was called.
+            for watched, data in self.finish():
+                watched.sink(data)
+        finally:
+            selector.close()
+            self.close()
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        events = []
+
+        def on_wake():
+            os.read(self.wake_read, 4096)
+            woken.set()
+
+        def on_events():
+            events.extend(self.inotify.read())
+            woken.set()
+
+        loop.add_reader(self.wake_read, on_wake)
+        try:
+            if self.use_inotify:
+                self.open_inotify()
+                loop.add_reader(self.inotify.fd, on_events)
+            while not self.stopping:
+                if self.use_inotify:
+                    pending, events[:] = events[:], []
+                    changes = self.handle_events(pending)
+                else:
+                    changes = () if self.ready else self.poll()
+                for watched, data in changes:
+                    await watched.sink(data)
+                for watched, data in self.turn():
+                    await watched.sink(data)
+                if self.ready:
+                    continue
+                woken.clear()
+                if self.use_inotify:
+                    await woken.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(woken.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+            for watched, data in self.finish():
+                await watched.sink(data)
+        finally:
+            loop.remove_reader(self.wake_read)
+            if self.inotify is not None:
+                loop.remove_reader(self.inotify.fd)
+            self.close()
+
+    def close(self):
+        with self.lock:
+            self.finished = True
+            if self.inotify is not None:
+                self.inotify.close()
+            os.close(self.wake_read)
+            os.close(self.wake_write)
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            if not self.finished:
+                os.write(self.wake_write, b'\0')
@@ -1,10 +1,7 @@
-def factorize(number):
-    for i in range(1, number + 1):
-        if number % i == 0:
-            yield i
-
 import time
 
+from threads_for_blocking_IO.factorization import divisors, factorize
+
 numbers = [2139079, 1214759, 1516637, 1852285]
 start = time.time()
 
@@ -15,6 +12,9 @@ end = time.time()
 delta = end - start
 print(f'Took {delta:.3f} seconds')
 
+# Start cold again so the threaded run computes rather than hits the memo.
+divisors.cache_clear()
+
 from threading import Thread
 
 class FactorizeThread(Thread):
@@ -76,3 +76,102 @@ for thread in threads:
 end = time.time()
 delta = end - start
 print(f'Took {delta:.3f} seconds')
+
+from threading import Event
+
+from threads_for_blocking_IO.reactor import Reactor, raise_fd_limit
+
+# Each "device" is one end of a socketpair; the other end answers after
+# a delay. Compare one thread blocked per device with one reactor thread
+# waiting on all of them, while the main thread keeps computing.
+def devices(count):
+    return [socket.socketpair() for _ in range(count)]
+
+def answer(pairs):
+    time.sleep(0.1)
+    for _, device in pairs:
+        device.send(b'x')
+
+def close(pairs):
+    for pair in pairs:
+        for sock in pair:
+            sock.close()
+
+def wait_with_threads(pairs):
+    threads = []
+    for sock, _ in pairs:
+        thread = Thread(target=sock.recv, args=(1,))
+        thread.start()
+        threads.append(thread)
+    answer(pairs)
+    for i in range(5):
+        compute_helicopter_location(i)
+    for thread in threads:
+        thread.join()
+
+def wait_with_reactor(reactor, pairs):
+    remaining = len(pairs)
+    done = Event()
+
+    def on_ready(sock, mask):
+        nonlocal remaining
+        sock.recv(1)
+        reactor.remove(sock)
+        remaining -= 1
+        if not remaining:
+            done.set()
+
+    for sock, _ in pairs:
+        sock.setblocking(False)
+        reactor.add_reader(sock, on_ready)
+    answer(pairs)
+    for i in range(5):
+        compute_helicopter_location(i)
+    done.wait()
+
+# Two descriptors per device, plus headroom; fewer devices if the hard
+# limit will not stretch that far.
+limit = raise_fd_limit(2 * 10_000 + 100)
+reactor = Reactor()
+reactor.start()
+for count in (10, 1_000, min(10_000, (limit - 100) // 2)):
+    for name in ('threads', 'reactor'):
+        pairs = devices(count)
+        start = time.time()
+        try:
+            if name == 'threads':
+                wait_with_threads(pairs)
+            else:
+                wait_with_reactor(reactor, pairs)
+        except RuntimeError as error:
+            print(f'{count} waits on {name}: {error}')
+            continue
+        finally:
+            end = time.time()
+            close(pairs)
+        delta = end - start
+        print(f'{count} waits on {name} took {delta:.3f} seconds')
+reactor.stop()
+
+import os
+
+from threads_for_blocking_IO.factorization import factorize_parallel
+
+# One huge semiprime: splitting it across numbers is no help here, so the
+# Pollard rho search itself is raced across processes.
+huge = 1000000000039 * 999999000001
+
+start = time.time()
+serial = list(factorize(huge))
+end = time.time()
+serial_delta = end - start
+print(f'Took {serial_delta:.3f} seconds')
+
+start = time.time()
+parallel = list(factorize_parallel(huge, 4))
+end = time.time()
+delta = end - start
+assert parallel == serial
+print(f'Took {delta:.3f} seconds')
+print(f'Speed-up {serial_delta / delta:.2f}x on {os.cpu_count()} CPUs '
+      f'(about sqrt(4) = 2x expected with 4 free CPUs)')
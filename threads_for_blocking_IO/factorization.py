@@ -0,0 +1,181 @@
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+import math
+import multiprocessing
+import os
+import random
+
+
+# Primes are found by trial division against a cached sieve up to
+# TRIAL_LIMIT; whatever composite cofactor is left after that is split with
+# Pollard's rho.
+TRIAL_LIMIT = 1 << 16
+
+sieve_limit = 1
+primes = []
+
+def primes_up_to(limit):
+    global sieve_limit, primes
+    if limit > sieve_limit:
+        limit = max(limit, 2 * sieve_limit)
+        sieve = bytearray([1]) * (limit + 1)
+        sieve[0:2] = b'\x00\x00'
+        for i in range(2, math.isqrt(limit) + 1):
+            if sieve[i]:
+                sieve[i * i::i] = bytes(len(range(i * i, limit + 1, i)))
+        primes = [i for i, flag in enumerate(sieve) if flag]
+        sieve_limit = limit
+    return primes[:bisect_right(primes, limit)]
+
+WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+def is_probable_prime(n):
+    if n < 2:
+        return False
+    for p in WITNESSES:
+        if n % p == 0:
+            return n == p
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    # These bases are exact for n < 3.3e24 and probabilistic beyond.
+    for a in WITNESSES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def pollard_rho(n, seed=None, stop=None):
+    if n % 2 == 0:
+        return 2
+    rng = random.Random(seed)
+    while True:
+        # Brent's cycle detection, multiplying differences together so only
+        # one gcd is taken per batch of steps.
+        y = rng.randrange(1, n)
+        c = rng.randrange(1, n)
+        m = 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                if stop is not None and stop.is_set():
+                    return None
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+def split_composite(n, factors):
+    if n == 1:
+        return
+    if is_probable_prime(n):
+        factors[n] = factors.get(n, 0) + 1
+        return
+    divisor = pollard_rho(n)
+    split_composite(divisor, factors)
+    split_composite(n // divisor, factors)
+
+def trial_divide(number, factors):
+    remaining = number
+    for p in primes_up_to(min(math.isqrt(number), TRIAL_LIMIT)):
+        if p * p > remaining:
+            break
+        while remaining % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            remaining //= p
+    return remaining
+
+def prime_factors(number):
+    factors = {}
+    split_composite(trial_divide(number, factors), factors)
+    return factors
+
+def divisors_from_factors(factors):
+    divisors = [1]
+    for p, exponent in factors.items():
+        divisors = [d * p ** e for d in divisors for e in range(exponent + 1)]
+    return sorted(divisors)
+
+@lru_cache(maxsize=4096)
+def divisors(number):
+    if number < 1:
+        return ()
+    return tuple(divisors_from_factors(prime_factors(number)))
+
+def factorize(number):
+    yield from divisors(number)
+
+# Each process runs Pollard's rho on the same cofactor from a different
+# random start; the first factor found wins and the shared event stops the
+# rest at their next gcd batch. Independent walks only shorten the expected
+# wait for the first collision by about sqrt(workers), so four processes
+# are roughly twice as fast, not four times.
+race_stop = None
+
+def join_race(stop):
+    global race_stop
+    race_stop = stop
+
+def race_rho(n, seed):
+    return pollard_rho(n, seed, race_stop)
+
+def split_parallel(n, pool, stop, workers):
+    stop.clear()
+    futures = {pool.submit(race_rho, n, random.getrandbits(64))
+               for _ in range(workers)}
+    divisor = None
+    while divisor is None:
+        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+        divisor = next((f.result() for f in done if f.result()), None)
+    stop.set()
+    wait(futures)
+    return divisor
+
+def factorize_parallel(number, workers=None):
+    if number < 1:
+        return
+    workers = workers or os.cpu_count() or 1
+    factors = {}
+    pending = [trial_divide(number, factors)]
+    pool = None
+    try:
+        while pending:
+            n = pending.pop()
+            if n == 1:
+                continue
+            if is_probable_prime(n):
+                factors[n] = factors.get(n, 0) + 1
+                continue
+            if pool is None:
+                stop = multiprocessing.Event()
+                pool = ProcessPoolExecutor(workers, initializer=join_race,
+                                           initargs=(stop,))
+            divisor = split_parallel(n, pool, stop, workers)
+            pending.extend((divisor, n // divisor))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    yield from divisors_from_factors(factors)
@@ -0,0 +1,78 @@
+from collections import deque
+import resource
+import selectors
+import socket
+from threading import Lock, Thread
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        if hard != resource.RLIM_INFINITY:
+            needed = min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+# One thread waits on every registered file with the platform's best
+# selector (epoll on Linux, so descriptors above FD_SETSIZE are fine) and
+# runs each ready callback as callback(fileobj, mask). Callbacks run on the
+# reactor thread and must not block. The selector is only touched from that
+# thread: other threads queue their changes and wake it through a socket.
+class Reactor(Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.waker, self.wakee = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wakee.setblocking(False)
+        self.selector.register(self.wakee, selectors.EVENT_READ, None)
+        self.lock = Lock()
+        self.calls = deque()
+        self.stopping = False
+
+    def call_soon(self, func, *args):
+        with self.lock:
+            self.calls.append((func, args))
+        try:
+            self.waker.send(b'\0')
+        except BlockingIOError:
+            pass    # A wake-up is already pending
+
+    def add_reader(self, fileobj, callback):
+        self.call_soon(self.selector.register, fileobj,
+                       selectors.EVENT_READ, callback)
+
+    def add_writer(self, fileobj, callback):
+        self.call_soon(self.selector.register, fileobj,
+                       selectors.EVENT_WRITE, callback)
+
+    def remove(self, fileobj):
+        self.call_soon(self.selector.unregister, fileobj)
+
+    def run_calls(self):
+        with self.lock:
+            calls, self.calls = self.calls, deque()
+        for func, args in calls:
+            func(*args)
+
+    def run(self):
+        while not self.stopping:
+            for key, mask in self.selector.select():
+                if key.data is None:
+                    try:
+                        while self.wakee.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    key.data(key.fileobj, mask)
+            self.run_calls()
+
+    def stop(self):
+        def stop():
+            self.stopping = True
+        self.call_soon(stop)
+        self.join()
+        self.selector.close()
+        self.waker.close()
+        self.wakee.close()
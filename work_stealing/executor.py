@@ -0,0 +1,156 @@
+from collections import deque
+from concurrent.futures import Executor, Future, wait
+import os
+from random import randrange
+from threading import Condition, Lock, Thread, local
+
+
+class WorkItem:
+    def __init__(self, future, fn, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as error:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+class Worker(Thread):
+    def __init__(self, executor, name):
+        super().__init__(name=name, daemon=True)
+        self.executor = executor
+        self.tasks = deque()
+
+    def run(self):
+        self.executor.current.worker = self
+        while True:
+            task = self.executor.find_task(self)
+            if task is None:
+                task = self.executor.sleep(self)
+                if task is None:
+                    return
+            task.run()
+            del task
+
+# Each worker pops its own deque from the right (newest first, so a task's
+# subtasks run while their data is hot) and steals from the left of a random
+# victim when it runs dry. Submissions from outside the pool go through a
+# shared injection deque. deque.append/pop/popleft are atomic, so the fast
+# path takes no lock; the condition is only used to park idle workers.
+class WorkStealingExecutor(Executor):
+    def __init__(self, max_workers=None, thread_name_prefix='work-stealing'):
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self.injector = deque()
+        self.condition = Condition()
+        self.idle = 0
+        self.stopping = False
+        self.current = local()
+        self.workers = [Worker(self, f'{thread_name_prefix}-{index}')
+                        for index in range(max_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self.stopping:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        future = Future()
+        task = WorkItem(future, fn, args, kwargs)
+        worker = getattr(self.current, 'worker', None)
+        if worker is not None and worker.executor is self:
+            worker.tasks.append(task)
+        else:
+            self.injector.append(task)
+        if self.idle:
+            with self.condition:
+                self.condition.notify()
+        return future
+
+    def find_task(self, worker):
+        try:
+            return worker.tasks.pop()
+        except IndexError:
+            pass
+        try:
+            return self.injector.popleft()
+        except IndexError:
+            pass
+        count = len(self.workers)
+        start = randrange(count)
+        for offset in range(count):
+            victim = self.workers[(start + offset) % count]
+            if victim is worker:
+                continue
+            try:
+                return victim.tasks.popleft()
+            except IndexError:
+                pass
+        return None
+
+    def sleep(self, worker):
+        with self.condition:
+            self.idle += 1
+            try:
+                while True:
+                    # Re-check under the lock: a submit that raced with us
+                    # either left a task we can see now or saw idle > 0.
+                    task = self.find_task(worker)
+                    if task is not None or self.stopping:
+                        return task
+                    self.condition.wait()
+            finally:
+                self.idle -= 1
+
+    def gather(self, futures):
+        futures = list(futures)
+        worker = getattr(self.current, 'worker', None)
+        if worker is None or worker.executor is not self:
+            return [future.result() for future in futures]
+
+        # Waiting inside a worker would park a thread that subtasks need, so
+        # keep running queued work until the futures we depend on are done.
+        for future in futures:
+            while not future.done():
+                task = self.find_task(worker)
+                if task is None:
+                    wait([future], timeout=0.001)
+                else:
+                    task.run()
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self.condition:
+            self.stopping = True
+            if cancel_futures:
+                queues = [self.injector] + [w.tasks for w in self.workers]
+                for tasks in queues:
+                    while tasks:
+                        try:
+                            tasks.popleft().future.cancel()
+                        except IndexError:
+                            break
+            self.condition.notify_all()
+        if wait:
+            for worker in self.workers:
+                if worker is not getattr(self.current, 'worker', None):
+                    worker.join()
+
+
+executor = None
+executor_lock = Lock()
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            max_workers = os.environ.get('WORK_STEALING_WORKERS')
+            executor = WorkStealingExecutor(
+                int(max_workers) if max_workers else None)
+        return executor